@@ -1,7 +1,8 @@
 from __future__ import annotations
 import json
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 def load_alias_map(path: str | Path) -> Dict[str, List[str]]:
     p = Path(path)
@@ -10,14 +11,27 @@ def load_alias_map(path: str | Path) -> Dict[str, List[str]]:
 def build_reverse_alias_map(canonical_to_aliases: Dict[str, List[str]]) -> Dict[str, str]:
     """
     Return: alias -> canonical (all lower-case, no spaces)
+
+    结果按别名表内容缓存，同一份别名表重复构建（如多次创建 CandidateGenerator）直接复用；
+    返回的 dict 在调用方之间共享，只读使用。
     """
+    frozen = tuple((canon, tuple(aliases)) for canon, aliases in canonical_to_aliases.items())
+    return _reverse_alias_map(frozen)
+
+@lru_cache(maxsize=8)
+def _reverse_alias_map(canonical_to_aliases: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> Dict[str, str]:
     rev: Dict[str, str] = {}
-    for canon, aliases in canonical_to_aliases.items():
+    for canon, aliases in canonical_to_aliases:
         canon_key = _key(canon)
         rev[canon_key] = canon
         for a in aliases:
             rev[_key(a)] = canon
     return rev
 
+# _key 结果缓存：AOI/道路/楼栋名在别名表和记录中大量重复，只需归一化一次；
+# 输入来自请求，限制容量以免长期运行的服务无限增长
+@lru_cache(maxsize=65536)
 def _key(s: str) -> str:
-    return "".join((s or "").lower().split())
+    if not s:
+        return ""
+    return "".join(s.lower().split())
@@ -1,20 +1,30 @@
 from __future__ import annotations
 from typing import Dict, List, Optional, Set, Tuple
 
+import pandas as pd
+
 from .models import AddressRecord, ParsedAddress
-from .utils import offset_latlon
-from .base_data import build_reverse_alias_map
+from .utils import offset_latlon, geohash_encode, geohash_encode_array, geohash_length_for, geohash_neighbors
+from .base_data import build_reverse_alias_map, _key
 
-def _key(s: str) -> str:
-    return "".join((s or "").lower().split())
+_EMPTY: frozenset = frozenset()
 
 class CandidateGenerator:
     """负责“候选召回”，即在消歧前为每条地址挑出少量可能的同实体记录，减少后续评分/裁决的计算量。"""
     def __init__(self, grid_precision: int, aoi_alias_map: Dict[str, List[str]], road_alias_map: Dict[str, List[str]]):
         self.grid_precision = grid_precision
+        # 地理桶使用 geohash，长度按 grid_precision（小数位）换算，格子尺度与按小数位取整时相当
+        self.geohash_len = geohash_length_for(grid_precision)
+        self._neighbors: Dict[str, List[str]] = {}
         # 构建 AOI/道路“别名->主名”反向索引，便于后续统一名称
         self.aoi_rev = build_reverse_alias_map(aoi_alias_map)
         self.road_rev = build_reverse_alias_map(road_alias_map)
+        # 名称 -> 索引键（_key(主名)）缓存；只由 build_indexes 按已建索引的记录整体重建，
+        # 查询时未命中的名称现算不入表，服务长期复用同一生成器时也不会随查询增长
+        self._aoi_keys: Dict[str, str] = {}
+        self._road_keys: Dict[str, str] = {}
+        # rid -> geo bucket；build_indexes 时批量编码写入，召回与锚点加分时直接查表
+        self._buckets: Dict[str, str] = {}
 
     def canonical_aoi(self, aoi: Optional[str]) -> Optional[str]:
         """把解析出的 AOI 名字映射到主名，减少别名差异"""
@@ -28,44 +38,67 @@ class CandidateGenerator:
             return None
         return self.road_rev.get(_key(road), road)
 
+    def aoi_key(self, aoi: str) -> str:
+        """AOI 在倒排索引中的键，等价于 _key(canonical_aoi(aoi))"""
+        k = self._aoi_keys.get(aoi)
+        if k is None:
+            k = _key(self.canonical_aoi(aoi))
+        return k
+
+    def road_key(self, road: str) -> str:
+        """道路在倒排索引中的键，等价于 _key(canonical_road(road))"""
+        k = self._road_keys.get(road)
+        if k is None:
+            k = _key(self.canonical_road(road))
+        return k
+
     def geo_bucket(self, lat: Optional[float], lon: Optional[float]) -> Optional[str]:
         if lat is None or lon is None:
             return None
-        # 将经纬度按精度取整，形成 geo bucket（地理网格 ID）
-        return f"{round(lat, self.grid_precision)}_{round(lon, self.grid_precision)}"
+        # 将经纬度编码为 geohash，作为 geo bucket（地理网格 ID）
+        return geohash_encode(lat, lon, self.geohash_len)
+
+    def record_bucket(self, rec: AddressRecord) -> Optional[str]:
+        """记录所在的 geo bucket，优先取 build_indexes 已算好的结果"""
+        b = self._buckets.get(rec.rid)
+        if b is None:
+            b = self.geo_bucket(rec.lat, rec.lon)
+        return b
 
     def geo_neighbors(self, bucket: str) -> List[str]:
-        try:
-            a, b = bucket.split("_")
-            lat = float(a); lon = float(b)
-        except Exception:
-            return [bucket]
-        step = 10 ** (-self.grid_precision)
-        out = []
-        for dlat in (-step, 0.0, step):
-            for dlon in (-step, 0.0, step):
-                out.append(f"{round(lat + dlat, self.grid_precision)}_{round(lon + dlon, self.grid_precision)}")
+        """bucket 自身及 8 个相邻格子；在 geohash 的整数格坐标上计算，并按 bucket 缓存"""
+        out = self._neighbors.get(bucket)
+        if out is None:
+            out = geohash_neighbors(bucket)
+            self._neighbors[bucket] = out
         return out
 
-    def build_indexes(self, rows: List[Tuple[AddressRecord, ParsedAddress]]) -> Dict[str, Dict[str, List[str]]]:
-        # 基于多种字段构建倒排索引，用于快速召回候选；得到【蜀山区】→[rid1, rid2,...]等映射
-        idx: Dict[str, Dict[str, List[str]]] = {"district": {}, "aoi": {}, "building": {}, "road": {}, "geo": {}}
-        for rec, p in rows:
-            rid = rec.rid
-            if p.district:
-                idx["district"].setdefault(p.district, []).append(rid)
-            if p.aoi:
-                canon = self.canonical_aoi(p.aoi)
-                idx["aoi"].setdefault(_key(canon), []).append(rid)
-            if p.building:
-                idx["building"].setdefault(p.building.upper(), []).append(rid)
-            if p.road:
-                canon_r = self.canonical_road(p.road)
-                idx["road"].setdefault(_key(canon_r), []).append(rid)
-            g = self.geo_bucket(rec.lat, rec.lon)
-            if g:
-                idx["geo"].setdefault(g, []).append(rid)
-        return idx
+    def build_indexes(self, rows: List[Tuple[AddressRecord, ParsedAddress]]) -> Dict[str, Dict[str, Set[str]]]:
+        # 基于多种字段构建倒排索引，用于快速召回候选；得到【蜀山区】→{rid1, rid2,...}等映射
+        # 倒排表直接存 set，召回时无需再把 list 转为 set
+        # 先把字段摊平成 DataFrame，再用向量化的字符串运算 + groupby 分桶，避免逐行 setdefault/append
+        df = pd.DataFrame(
+            [(rec.rid, p.district, p.aoi, p.building, p.road, rec.lat, rec.lon) for rec, p in rows],
+            columns=["rid", "district", "aoi", "building", "road", "lat", "lon"],
+        )
+        rids = df["rid"]
+        lat, lon = df["lat"].astype(float), df["lon"].astype(float)
+        has_geo = lat.notna() & lon.notna()
+        geo = pd.Series(None, index=df.index, dtype=object)
+        geo[has_geo] = geohash_encode_array(lat[has_geo].to_numpy(), lon[has_geo].to_numpy(), self.geohash_len)
+        has_aoi, has_road = _present(df["aoi"]), _present(df["road"])
+        aoi_keys = _canonical_keys(df["aoi"], self.aoi_rev)
+        road_keys = _canonical_keys(df["road"], self.road_rev)
+        self._aoi_keys = dict(zip(df["aoi"][has_aoi], aoi_keys[has_aoi]))
+        self._road_keys = dict(zip(df["road"][has_road], road_keys[has_road]))
+        self._buckets = dict(zip(rids[has_geo], geo[has_geo]))
+        return {
+            "district": _group_rids(rids, df["district"], _present(df["district"])),
+            "aoi": _group_rids(rids, aoi_keys, has_aoi),
+            "building": _group_rids(rids, df["building"].str.upper(), _present(df["building"])),
+            "road": _group_rids(rids, road_keys, has_road),
+            "geo": _group_rids(rids, geo, has_geo),
+        }
 
     def relative_anchor_bucket(self, anchor_lat: float, anchor_lon: float,
                                direction: Optional[str], distance_m: Optional[int]) -> str:
@@ -79,7 +112,7 @@ class CandidateGenerator:
     def candidates_for(self,
                        rec: AddressRecord,
                        p: ParsedAddress,
-                       indexes: Dict[str, Dict[str, List[str]]],
+                       indexes: Dict[str, Dict[str, Set[str]]],
                        seen: Set[str],
                        anchor_bucket: Optional[str],
                        max_candidates: int) -> List[str]:
@@ -88,32 +121,52 @@ class CandidateGenerator:
         解决了“从海量记录中高效召回少量可能同实体对象”的问题"""
         cand: Set[str] = set()
 
-        if p.district and p.district in indexes["district"]:
-            cand |= set(indexes["district"][p.district])
+        if p.district:
+            cand |= indexes["district"].get(p.district, _EMPTY)
 
         if p.aoi:
-            canon = self.canonical_aoi(p.aoi)
-            cand |= set(indexes["aoi"].get(_key(canon), []))
+            cand |= indexes["aoi"].get(self.aoi_key(p.aoi), _EMPTY)
 
         if p.building:
-            cand |= set(indexes["building"].get(p.building.upper(), []))
+            cand |= indexes["building"].get(p.building.upper(), _EMPTY)
 
         if p.road:
-            canon_r = self.canonical_road(p.road)
-            cand |= set(indexes["road"].get(_key(canon_r), []))
-
-        g = self.geo_bucket(rec.lat, rec.lon)
-        if g:
-            for nb in self.geo_neighbors(g):
-                cand |= set(indexes["geo"].get(nb, []))
-
-        if anchor_bucket:
-            for nb in self.geo_neighbors(anchor_bucket):
-                cand |= set(indexes["geo"].get(nb, []))
-
-        # 去掉自身，并且只保留“已解析完成”的记录（seen 是可匹配集合）
+            cand |= indexes["road"].get(self.road_key(p.road), _EMPTY)
+
+        # 自身网格与锚点网格的 3x3 邻域常有重叠（甚至同一格），先合并去重再查索引
+        g = self.record_bucket(rec)
+        neighbors: Set[str] = set(self.geo_neighbors(g)) if g else set()
+        if anchor_bucket and anchor_bucket != g:
+            neighbors.update(self.geo_neighbors(anchor_bucket))
+        geo_index = indexes["geo"]
+        for nb in neighbors:
+            cand |= geo_index.get(nb, _EMPTY)
+
+        # 去掉自身，并且只保留“已解析完成”的记录（seen 是可匹配集合，调用方须传入 set，这里不再复制）
         cand.discard(rec.rid)
-        cand &= set(seen)
+        cand &= seen
 
         out = list(cand)
         return out[:max_candidates]
+
+
+def _present(col: pd.Series) -> pd.Series:
+    """与逐行写法中的 `if p.xxx:` 等价：排除缺失值与空串"""
+    return col.notna() & (col != "")
+
+
+def _normalize_keys(col: pd.Series) -> pd.Series:
+    """_key 的向量化版本：小写并去除所有空白"""
+    return col.str.lower().str.replace(r"\s+", "", regex=True)
+
+
+def _canonical_keys(names: pd.Series, rev: Dict[str, str]) -> pd.Series:
+    """别名 -> 主名 -> 归一化键，等价于逐行的 _key(canonical_xxx(name))"""
+    canon = _normalize_keys(names).map(rev).fillna(names)
+    return _normalize_keys(canon)
+
+
+def _group_rids(rids: pd.Series, keys: pd.Series, mask: pd.Series) -> Dict[str, Set[str]]:
+    if not mask.any():
+        return {}
+    return rids[mask].groupby(keys[mask], sort=False).agg(set).to_dict()
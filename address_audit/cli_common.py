@@ -0,0 +1,19 @@
+from __future__ import annotations
+import os
+from pathlib import Path
+from typing import Optional
+
+from .config import Config, load_config
+
+# 各 CLI 共用的数据目录（仓库根目录下的 data/），首次调用时解析一次
+_DATA_DIR: Optional[Path] = None
+
+def get_data_dir() -> Path:
+    global _DATA_DIR
+    if _DATA_DIR is None:
+        # abspath 只做字符串拼接，不像 resolve() 那样逐级 stat
+        _DATA_DIR = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) / "data"
+    return _DATA_DIR
+
+def load_default_config() -> Config:
+    return load_config(get_data_dir() / "config.default.json")
@@ -7,10 +7,12 @@ class UnionFind:
         self.rank = {x: 0 for x in items}
 
     def find(self, x: str) -> str:
-        p = self.parent[x]
-        if p != x:
-            self.parent[x] = self.find(p)
-        return self.parent[x]
+        # 迭代式路径减半：沿途把节点挂到祖父节点上，免去递归调用开销；根节点与完全路径压缩相同
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
 
     def union(self, a: str, b: str):
         ra, rb = self.find(a), self.find(b)
@@ -1,10 +1,12 @@
 from __future__ import annotations
 import json
+import os
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Config:
     db_path: str
     grid_precision: int
@@ -15,7 +17,13 @@ class Config:
     parser: Dict[str, Any]
 
 def load_config(path: str | Path) -> Config:
-    p = Path(path)
+    """读取配置文件；同一文件未修改时返回缓存的同一个 Config，其中的 dict 字段请勿原地修改。"""
+    p = Path(os.path.abspath(path))
+    return _load_config(p, p.stat().st_mtime_ns)
+
+@lru_cache(maxsize=8)
+def _load_config(p: Path, mtime_ns: int) -> Config:
+    # mtime_ns 只参与缓存键：文件被改写后重新解析
     raw = json.loads(p.read_text(encoding="utf-8"))
     return Config(
         db_path=raw["db_path"],
@@ -1,12 +1,16 @@
 from __future__ import annotations
-import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import pandas as pd
 
 from .models import AddressRecord, ParsedAddress, Conflict
+from .utils import json_dumps, json_loads
 
 TABLE_SCHEMAS: Dict[str, List[str]] = {
     "address_records": ["rid", "source", "raw_address", "district_claim", "grid_district", "lat", "lon", "extra_json", "created_at"],
@@ -25,18 +29,62 @@ TABLE_SCHEMAS: Dict[str, List[str]] = {
     "pair_labels": ["id", "rid1", "rid2", "label"],
 }
 
+# 各表主键；自增 id 由存储层分配，写入时无需提供
+TABLE_KEYS: Dict[str, Optional[str]] = {
+    "address_records": "rid",
+    "parsed_addresses": "rid",
+    "roads": "road_id",
+    "pois": "poi_id",
+    "anchors": "anchor_id",
+    "conflicts": "id",
+    "match_logs": "id",
+    "clusters": None,
+    "pair_labels": "id",
+}
+
+# SQLite 列类型；未列出的列按 TEXT 处理
+_COLUMN_TYPES: Dict[str, str] = {
+    "id": "INTEGER",
+    "lat": "REAL",
+    "lon": "REAL",
+    "distance_m": "INTEGER",
+    "label": "INTEGER",
+}
+
+SQLITE_SUFFIXES = {".sqlite", ".sqlite3", ".db"}
+# 单条语句的绑定参数上限（旧版 SQLite 默认 999），IN (...) 查询按此分块
+SQLITE_MAX_PARAMS = 500
+# 表结构版本，记录在 SQLite 的 PRAGMA user_version 中；修改 TABLE_SCHEMAS / TABLE_KEYS / _COLUMN_TYPES 时递增
+SCHEMA_VERSION = 1
+# 连接级调优：WAL 下 NORMAL 只在检查点时 fsync，掉电最多丢最近的事务、不会损坏库；
+# 页缓存约 200MB（负数单位为 KiB），读通过 256MB 内存映射完成，临时表/排序放内存
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-200000",
+    "PRAGMA mmap_size=268435456",
+)
+
+def _apply_pragmas(raw: sqlite3.Connection) -> None:
+    for stmt in SQLITE_PRAGMAS:
+        raw.execute(stmt)
+
 def _now_str() -> str:
+    # 批量写入时由调用方取一次、通过 now 参数复用，避免逐行取时间
     return datetime.utcnow().isoformat(timespec="seconds")
 
 def _empty_table(name: str) -> pd.DataFrame:
     return pd.DataFrame(columns=TABLE_SCHEMAS[name])
 
 def _ensure_columns(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
-    result = df.copy()
+    # 只用于刚从工作簿读出的表，直接原地补列；列序已一致时不再重建 DataFrame
     for col in columns:
-        if col not in result.columns:
-            result[col] = None
-    return result[columns]
+        if col not in df.columns:
+            df[col] = None
+    if list(df.columns) == columns:
+        return df
+    return df.reindex(columns=columns)
 
 def _clean_value(val: Any) -> Any:
     if val is None:
@@ -51,6 +99,12 @@ def _clean_value(val: Any) -> Any:
 def _row_to_dict(row: pd.Series) -> Dict[str, Any]:
     return {k: _clean_value(v) for k, v in row.to_dict().items()}
 
+def _frame_to_dicts(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    # 整表一次性把缺失值换成 None 再转 dict，结果与逐行 _row_to_dict 相同，但不走 iterrows/逐格 isna
+    if df.empty:
+        return []
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
 def _next_pk(df: pd.DataFrame, column: str = "id") -> int:
     if df.empty or column not in df.columns:
         return 1
@@ -67,35 +121,438 @@ class ExcelConnection:
         self.tables: Dict[str, pd.DataFrame] = {
             name: _empty_table(name) for name in TABLE_SCHEMAS
         }
+        # 新追加的行先缓存在列表里，读表或保存时再一次性并入 DataFrame，避免逐行 concat
+        self._pending: Dict[str, List[Dict[str, Any]]] = {name: [] for name in TABLE_SCHEMAS}
+        # (表, 列) -> {值: 行号} 的哈希索引，按需构建；行号覆盖 DataFrame 行与缓冲行（缓冲行排在之后）
+        self._indexes: Dict[Tuple[str, str], Dict[Any, int]] = {}
+        self._batch_depth = 0
+        self._dirty = False
+        # 工作簿已包含全部工作表与列时，init_schema 无需重写文件
+        self._schema_current = False
+        self._load()
+
+    def _load(self) -> None:
+        """从磁盘读取工作簿，覆盖内存中的表、缓冲行与索引。"""
+        self.tables = {name: _empty_table(name) for name in TABLE_SCHEMAS}
+        self._pending = {name: [] for name in TABLE_SCHEMAS}
+        self._indexes = {}
+        self._dirty = False
+        self._schema_current = False
         if self.path.exists():
             xls = pd.read_excel(self.path, sheet_name=None)
             for name, cols in TABLE_SCHEMAS.items():
                 if name in xls:
                     self.tables[name] = _ensure_columns(xls[name], cols)
+            self._schema_current = all(
+                name in xls and set(cols) <= set(xls[name].columns) for name, cols in TABLE_SCHEMAS.items()
+            )
 
     def save(self) -> None:
         with pd.ExcelWriter(self.path, engine="openpyxl") as writer:
-            for name, df in self.tables.items():
+            for name in self.tables:
+                self._table(name).to_excel(writer, sheet_name=name, index=False)
+        self._dirty = False
+
+    def _table(self, name: str) -> pd.DataFrame:
+        """返回完整的表：先把缓冲区中的新行一次性并入（行号不变，索引仍然有效）。"""
+        pending = self._pending[name]
+        if pending:
+            self.tables[name] = pd.concat([self.tables[name], pd.DataFrame(pending)], ignore_index=True)
+            self._pending[name] = []
+        return self.tables[name]
+
+    def _next_id(self, table: str) -> int:
+        pending = self._pending[table]
+        if pending:
+            return int(pending[-1]["id"]) + 1
+        return _next_pk(self.tables[table])
+
+    def _index(self, table: str, column: str) -> Dict[Any, int]:
+        index = self._indexes.get((table, column))
+        if index is None:
+            index = {}
+            values = self.tables[table][column].tolist() + [r.get(column) for r in self._pending[table]]
+            for pos, val in enumerate(values):
+                val = _clean_value(val)
+                if val is not None:
+                    # 与 df[col] == value 取第一条匹配的语义一致
+                    index.setdefault(val, pos)
+            self._indexes[(table, column)] = index
+        return index
+
+    def _drop_indexes(self, table: str, except_column: Optional[str] = None) -> None:
+        for key in [k for k in self._indexes if k[0] == table and k[1] != except_column]:
+            del self._indexes[key]
+
+    def _row_at(self, table: str, pos: int) -> Dict[str, Any]:
+        df = self.tables[table]
+        if pos < len(df):
+            return _row_to_dict(df.iloc[pos])
+        row = self._pending[table][pos - len(df)]
+        return {col: _clean_value(row.get(col)) for col in TABLE_SCHEMAS[table]}
+
+    def _append(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        pos = len(self.tables[table]) + len(self._pending[table])
+        self._pending[table].extend(rows)
+        for (t, col), index in self._indexes.items():
+            if t != table:
+                continue
+            for i, row in enumerate(rows):
+                val = row.get(col)
+                if val is not None:
+                    index.setdefault(val, pos + i)
+
+    @contextmanager
+    def batch(self) -> Iterator["ExcelConnection"]:
+        """批量写入：块内的修改只在最外层正常退出时写一次工作簿；异常退出时丢弃未写出的修改并从磁盘重新加载。"""
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._dirty:
+                # 块外的修改都已即时写盘，重新加载即回到进入 batch 前的状态
+                self._load()
+            raise
+        else:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._dirty:
+                self.save()
+
+    def _mark_dirty(self) -> None:
+        self._dirty = True
+        if self._batch_depth == 0:
+            self.save()
+
+    def init_schema(self) -> None:
+        if not self._schema_current:
+            self.save()
+            self._schema_current = True
+
+    def upsert(self, table: str, row: Dict[str, Any], keep: Sequence[str] = ()) -> None:
+        """按主键插入或覆盖一行；keep 中的列在覆盖时保留旧值。"""
+        key_field = TABLE_KEYS[table]
+        pos = self._index(table, key_field).get(row[key_field])
+        if pos is None:
+            self._append(table, [row])
+            self._mark_dirty()
+            return
+        df = self.tables[table]
+        if pos < len(df):
+            idx = df.index[pos]
+            for col in keep:
+                row[col] = _clean_value(df.at[idx, col])
+            for col in df.columns:
+                df.at[idx, col] = row.get(col)
+        else:
+            pending = self._pending[table]
+            old = pending[pos - len(df)]
+            for col in keep:
+                row[col] = old.get(col)
+            pending[pos - len(df)] = row
+        # 主键不变，其他列的值可能已改变
+        self._drop_indexes(table, except_column=key_field)
+        self._mark_dirty()
+
+    def upsert_many(self, table: str, rows: List[Dict[str, Any]], keep: Sequence[str] = ()) -> None:
+        """同 upsert，整体只落盘一次；主键尚不存在的连续多行一次性追加，已存在的行逐行覆盖。"""
+        key_field = TABLE_KEYS[table]
+        fresh: List[Dict[str, Any]] = []
+        fresh_keys = set()
+        with self.batch():
+            for row in rows:
+                key = row[key_field]
+                if key is not None and key not in fresh_keys and key not in self._index(table, key_field):
+                    fresh.append(row)
+                    fresh_keys.add(key)
+                    continue
+                if fresh:
+                    self._append(table, fresh)
+                    fresh, fresh_keys = [], set()
+                self.upsert(table, row, keep=keep)
+            if fresh:
+                self._append(table, fresh)
+                self._mark_dirty()
+
+    def insert_many(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        """追加多行；带自增 id 的表在此分配 id。"""
+        if not rows:
+            return
+        if TABLE_KEYS[table] == "id":
+            next_id = self._next_id(table)
+            rows = [{**row, "id": next_id + i} for i, row in enumerate(rows)]
+        self._append(table, rows)
+        self._mark_dirty()
+
+    def replace_all(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        self.tables[table] = pd.DataFrame(rows, columns=TABLE_SCHEMAS[table])
+        self._pending[table] = []
+        self._drop_indexes(table)
+        self._mark_dirty()
+
+    def clear(self, table: str) -> None:
+        self.tables[table] = _empty_table(table)
+        self._pending[table] = []
+        self._drop_indexes(table)
+        self._mark_dirty()
+
+    def fetch_one(self, table: str, column: str, value: Any) -> Optional[Dict[str, Any]]:
+        pos = self._index(table, column).get(value)
+        if pos is None:
+            return None
+        return self._row_at(table, pos)
+
+    def fetch_many(self, table: str, column: str, values: Sequence[Any]) -> Dict[Any, Dict[str, Any]]:
+        """按列值批量取行：值 -> 第一条匹配行，未命中的值不出现在结果中。"""
+        index = self._index(table, column)
+        out: Dict[Any, Dict[str, Any]] = {}
+        for val in values:
+            pos = index.get(val)
+            if pos is not None and val not in out:
+                out[val] = self._row_at(table, pos)
+        return out
+
+    def fetch_all(self, table: str, order_by: Optional[str] = None) -> List[Dict[str, Any]]:
+        df = self._table(table)
+        if order_by and order_by in df.columns:
+            # 稳定排序：同一时间戳的行保持写入顺序，与 SQLite 按 rowid 兜底一致
+            df = df.sort_values(by=order_by, na_position="last", kind="stable")
+        return _frame_to_dicts(df)
+
+class SQLiteConnection:
+    """SQLite 连接：每次写入只触及单行，不必像 Excel 那样整本重写；表结构与 TABLE_SCHEMAS 一致。"""
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.raw = sqlite3.connect(str(self.path), isolation_level=None)
+        self.raw.row_factory = sqlite3.Row
+        _apply_pragmas(self.raw)
+        self._batch_depth = 0
+        self.closed = False
+
+    def save(self) -> None:
+        # 自动提交模式下每条语句已落盘，保留该方法以兼容 ExcelConnection 的接口
+        return None
+
+    @contextmanager
+    def batch(self) -> Iterator["SQLiteConnection"]:
+        """批量写入：最外层包一个事务，正常退出时统一提交；异常退出时整体回滚并抛出原异常。"""
+        if self._batch_depth == 0:
+            self.raw.execute("BEGIN")
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            # SQLite 可能已自行回滚（如 SQLITE_FULL），此时不能再发 ROLLBACK，以免掩盖原异常
+            if self._batch_depth == 0 and self.raw.in_transaction:
+                self.raw.execute("ROLLBACK")
+            raise
+        else:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.raw.execute("COMMIT")
+
+    def close(self) -> None:
+        self.raw.close()
+        self.closed = True
+
+    def init_schema(self) -> None:
+        if self.raw.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return
+        for name, cols in TABLE_SCHEMAS.items():
+            key_field = TABLE_KEYS[name]
+            col_defs = []
+            for col in cols:
+                col_def = f"{col} {_COLUMN_TYPES.get(col, 'TEXT')}"
+                if col == key_field:
+                    col_def += " PRIMARY KEY"
+                col_defs.append(col_def)
+            self.raw.execute(f"CREATE TABLE IF NOT EXISTS {name} ({', '.join(col_defs)})")
+        self.raw.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _upsert_sql(self, table: str, keep: Sequence[str]) -> str:
+        key_field = TABLE_KEYS[table]
+        cols = TABLE_SCHEMAS[table]
+        updates = ", ".join(f"{c}=excluded.{c}" for c in cols if c != key_field and c not in keep)
+        return (
+            f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)}) "
+            f"ON CONFLICT({key_field}) DO UPDATE SET {updates}"
+        )
+
+    def upsert(self, table: str, row: Dict[str, Any], keep: Sequence[str] = ()) -> None:
+        """INSERT ... ON CONFLICT DO UPDATE；keep 中的列在冲突时保留旧值。"""
+        self.raw.execute(self._upsert_sql(table, keep), [row.get(c) for c in TABLE_SCHEMAS[table]])
+
+    def upsert_many(self, table: str, rows: List[Dict[str, Any]], keep: Sequence[str] = ()) -> None:
+        """同 upsert，一条 executemany 在一个事务内写入多行。"""
+        if not rows:
+            return
+        cols = TABLE_SCHEMAS[table]
+        with self.batch():
+            self.raw.executemany(self._upsert_sql(table, keep), [[row.get(c) for c in cols] for row in rows])
+
+    def insert_many(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        """追加多行；自增 id 交给 SQLite 分配。"""
+        if not rows:
+            return
+        cols = [c for c in TABLE_SCHEMAS[table] if not (c == "id" and TABLE_KEYS[table] == "id")]
+        sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})"
+        with self.batch():
+            self.raw.executemany(sql, [[row.get(c) for c in cols] for row in rows])
+
+    def replace_all(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        cols = TABLE_SCHEMAS[table]
+        sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})"
+        with self.batch():
+            self.raw.execute(f"DELETE FROM {table}")
+            self.raw.executemany(sql, [[row.get(c) for c in cols] for row in rows])
+
+    def clear(self, table: str) -> None:
+        self.raw.execute(f"DELETE FROM {table}")
+
+    def fetch_one(self, table: str, column: str, value: Any) -> Optional[Dict[str, Any]]:
+        cur = self.raw.execute(f"SELECT * FROM {table} WHERE {column} = ? LIMIT 1", (value,))
+        row = cur.fetchone()
+        return dict(row) if row is not None else None
+
+    def fetch_many(self, table: str, column: str, values: Sequence[Any]) -> Dict[Any, Dict[str, Any]]:
+        """按列值批量取行（WHERE ... IN，按 SQLITE_MAX_PARAMS 分块）；同值多行时与 fetch_one 一样取 rowid 最小的一行。"""
+        out: Dict[Any, Dict[str, Any]] = {}
+        uniq = list(dict.fromkeys(values))
+        for i in range(0, len(uniq), SQLITE_MAX_PARAMS):
+            chunk = uniq[i:i + SQLITE_MAX_PARAMS]
+            sql = f"SELECT * FROM {table} WHERE {column} IN ({', '.join('?' for _ in chunk)}) ORDER BY rowid"
+            for row in self.raw.execute(sql, chunk):
+                out.setdefault(row[column], dict(row))
+        return out
+
+    def fetch_all(self, table: str, order_by: Optional[str] = None) -> List[Dict[str, Any]]:
+        sql = f"SELECT * FROM {table}"
+        if order_by:
+            # 与 pandas 的 na_position="last" 保持一致
+            sql += f" ORDER BY {order_by} IS NULL, {order_by}, rowid"
+        return [dict(row) for row in self.raw.execute(sql)]
+
+    def export_excel(self, path: str | Path) -> None:
+        """导出为 Excel 工作簿，仅供人工查看。"""
+        with pd.ExcelWriter(Path(path), engine="openpyxl") as writer:
+            for name in TABLE_SCHEMAS:
+                df = pd.read_sql_query(f"SELECT * FROM {name}", self.raw)
                 df.to_excel(writer, sheet_name=name, index=False)
 
-def connect(db_path: str | Path) -> ExcelConnection:
+class LLMResponseCache:
+    """LLM 解析结果缓存：内存 dict 在前，可选 SQLite 文件（表 llm_cache）持久化，跨进程/跨运行复用。"""
+    def __init__(self, path: str | Path | None = None, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._mem: "OrderedDict[str, Any]" = OrderedDict()
+        # FastAPI 的同步接口在线程池中执行，共用一个 SQLite 连接及内存表的写入/淘汰需要加锁
+        self._lock = threading.Lock()
+        self.raw: Optional[sqlite3.Connection] = None
+        if path:
+            p = Path(path)
+            p.parent.mkdir(parents=True, exist_ok=True)
+            self.raw = sqlite3.connect(str(p), isolation_level=None, check_same_thread=False)
+            _apply_pragmas(self.raw)
+            self.raw.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, json_blob TEXT)")
+
+    def get(self, key: str) -> Any:
+        hit = self._mem.get(key)
+        if hit is not None or self.raw is None:
+            return hit
+        with self._lock:
+            row = self.raw.execute("SELECT json_blob FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value = json_loads(row[0])
+        self._remember(key, value)
+        return value
+
+    def peek(self, key: str) -> Any:
+        """只查内存层，不触及 SQLite，可直接在事件循环中调用。"""
+        return self._mem.get(key)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        """按键批量查询（内存未命中的走一次 WHERE ... IN，按 SQLITE_MAX_PARAMS 分块），返回命中的 键 -> 值。"""
+        out: Dict[str, Any] = {}
+        rest: List[str] = []
+        for key in dict.fromkeys(keys):
+            hit = self._mem.get(key)
+            if hit is not None:
+                out[key] = hit
+            else:
+                rest.append(key)
+        if not rest or self.raw is None:
+            return out
+        rows = []
+        with self._lock:
+            for i in range(0, len(rest), SQLITE_MAX_PARAMS):
+                chunk = rest[i:i + SQLITE_MAX_PARAMS]
+                sql = f"SELECT key, json_blob FROM llm_cache WHERE key IN ({', '.join('?' for _ in chunk)})"
+                rows.extend(self.raw.execute(sql, chunk).fetchall())
+        for key, blob in rows:
+            value = json_loads(blob)
+            self._remember(key, value)
+            out[key] = value
+        return out
+
+    def put(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        if self.raw is not None:
+            with self._lock:
+                self.raw.execute(
+                    "INSERT INTO llm_cache (key, json_blob) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET json_blob = excluded.json_blob",
+                    (key, json_dumps(value)),
+                )
+
+    def _remember(self, key: str, value: Any) -> None:
+        # 超出容量时按写入顺序淘汰最早的条目；判断、淘汰与插入整体在锁内完成
+        with self._lock:
+            if key not in self._mem and len(self._mem) >= self.maxsize:
+                self._mem.popitem(last=False)
+            self._mem[key] = value
+
+    def close(self) -> None:
+        if self.raw is not None:
+            self.raw.close()
+            self.raw = None
+
+Connection = Union[ExcelConnection, SQLiteConnection]
+
+def connect(db_path: str | Path) -> Connection:
+    """按文件后缀选择存储：.sqlite/.sqlite3/.db 使用 SQLite，其余按 Excel 工作簿处理。"""
+    if Path(db_path).suffix.lower() in SQLITE_SUFFIXES:
+        return SQLiteConnection(db_path)
     return ExcelConnection(db_path)
 
-def init_db(conn: ExcelConnection) -> None:
-    conn.save()
+# 每个线程按库文件复用一个 SQLite 连接
+_POOL = threading.local()
 
-def _upsert_row(df: pd.DataFrame, row: Dict[str, Any], key_field: str) -> pd.DataFrame:
-    mask = df[key_field] == row[key_field]
-    if mask.any():
-        idx = df.index[mask][0]
-        for col in df.columns:
-            df.at[idx, col] = row.get(col)
-        return df
-    return pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+def get_conn(db_path: str | Path) -> Connection:
+    """同 connect，但 SQLite 库在同一线程内复用已打开的连接（关闭后再次调用会重新打开）。
+    Excel 工作簿连接持有整本表的内存快照，仍每次新建。"""
+    if Path(db_path).suffix.lower() not in SQLITE_SUFFIXES:
+        return ExcelConnection(db_path)
+    conns: Dict[str, SQLiteConnection] = _POOL.__dict__.setdefault("conns", {})
+    key = str(Path(db_path).resolve())
+    conn = conns.get(key)
+    if conn is None or conn.closed:
+        conn = conns[key] = SQLiteConnection(db_path)
+    return conn
+
+def init_db(conn: Connection) -> None:
+    conn.init_schema()
 
-def upsert_record(conn: ExcelConnection, r: AddressRecord) -> None:
-    df = conn.tables["address_records"]
-    row = {
+def upsert_record(conn: Connection, r: AddressRecord, now: Optional[str] = None) -> None:
+    conn.upsert("address_records", _record_row(r, now or _now_str()), keep=("created_at",))
+
+def upsert_records_many(conn: Connection, records: List[AddressRecord], now: Optional[str] = None) -> None:
+    now = now or _now_str()
+    conn.upsert_many("address_records", [_record_row(r, now) for r in records], keep=("created_at",))
+
+def _record_row(r: AddressRecord, now: str) -> Dict[str, Any]:
+    return {
         "rid": r.rid,
         "source": r.source,
         "raw_address": r.raw_address,
@@ -103,32 +560,28 @@ def upsert_record(conn: ExcelConnection, r: AddressRecord) -> None:
         "grid_district": r.grid_district,
         "lat": r.lat,
         "lon": r.lon,
-        "extra_json": json.dumps(r.extra, ensure_ascii=False),
-        "created_at": _now_str()
+        "extra_json": json_dumps(r.extra),
+        "created_at": now
     }
-    mask = df["rid"] == r.rid
-    if mask.any():
-        row["created_at"] = _clean_value(df.loc[mask, "created_at"].iloc[0])
-    df = _upsert_row(df, row, "rid")
-    conn.tables["address_records"] = df
-    conn.save()
-
-def list_records(conn: ExcelConnection) -> List[Dict[str, Any]]:
-    df = conn.tables["address_records"]
-    if "created_at" in df.columns:
-        df = df.sort_values(by="created_at", na_position="last")
-    return [_row_to_dict(row) for _, row in df.iterrows()]
-
-def get_record(conn: ExcelConnection, rid: str) -> Optional[Dict[str, Any]]:
-    df = conn.tables["address_records"]
-    match = df[df["rid"] == rid]
-    if match.empty:
-        return None
-    return _row_to_dict(match.iloc[0])
 
-def upsert_parsed(conn: ExcelConnection, rid: str, p: ParsedAddress) -> None:
-    df = conn.tables["parsed_addresses"]
-    row = {
+def list_records(conn: Connection) -> List[Dict[str, Any]]:
+    return conn.fetch_all("address_records", order_by="created_at")
+
+def get_record(conn: Connection, rid: str) -> Optional[Dict[str, Any]]:
+    return conn.fetch_one("address_records", "rid", rid)
+
+def get_records(conn: Connection, rids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    return conn.fetch_many("address_records", "rid", rids)
+
+def upsert_parsed(conn: Connection, rid: str, p: ParsedAddress, now: Optional[str] = None) -> None:
+    conn.upsert("parsed_addresses", _parsed_row(rid, p, now or _now_str()))
+
+def upsert_parsed_many(conn: Connection, items: List[Tuple[str, ParsedAddress]], now: Optional[str] = None) -> None:
+    now = now or _now_str()
+    conn.upsert_many("parsed_addresses", [_parsed_row(rid, p, now) for rid, p in items])
+
+def _parsed_row(rid: str, p: ParsedAddress, now: str) -> Dict[str, Any]:
+    return {
         "rid": rid,
         "norm_text": p.norm_text,
         "province": p.province,
@@ -143,84 +596,116 @@ def upsert_parsed(conn: ExcelConnection, rid: str, p: ParsedAddress) -> None:
         "floor": p.floor,
         "room": p.room,
         "shop_name": p.shop_name,
-        "intersection_json": json.dumps(p.intersection, ensure_ascii=False) if p.intersection else None,
+        "intersection_json": json_dumps(p.intersection) if p.intersection else None,
         "direction": p.direction,
         "distance_m": p.distance_m,
-        "parsed_at": _now_str()
+        "parsed_at": now
     }
-    df = _upsert_row(df, row, "rid")
-    conn.tables["parsed_addresses"] = df
-    conn.save()
-
-def get_parsed(conn: ExcelConnection, rid: str) -> Optional[Dict[str, Any]]:
-    df = conn.tables["parsed_addresses"]
-    match = df[df["rid"] == rid]
-    if match.empty:
-        return None
-    return _row_to_dict(match.iloc[0])
+
+def get_parsed(conn: Connection, rid: str) -> Optional[Dict[str, Any]]:
+    return conn.fetch_one("parsed_addresses", "rid", rid)
+
+def get_parsed_many(conn: Connection, rids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    return conn.fetch_many("parsed_addresses", "rid", rids)
 
 
-def clear_table(conn: ExcelConnection, table: str) -> None:
+def clear_table(conn: Connection, table: str) -> None:
     if table not in TABLE_SCHEMAS:
         raise ValueError(f"Unknown table: {table}")
-    conn.tables[table] = _empty_table(table)
-    conn.save()
-
-def insert_match_log(conn: ExcelConnection, rid_query: str, candidate_rids: List[str],
-                     pre_scores: List[Dict[str, Any]], final: Dict[str, Any]) -> None:
-    df = conn.tables["match_logs"]
-    row = {
-        "id": _next_pk(df),
-        "rid_query": rid_query,
-        "candidate_rids_json": json.dumps(candidate_rids, ensure_ascii=False),
-        "pre_scores_json": json.dumps(pre_scores, ensure_ascii=False),
-        "final_json": json.dumps(final, ensure_ascii=False),
-        "created_at": _now_str()
-    }
-    df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-    conn.tables["match_logs"] = df
-    conn.save()
+    conn.clear(table)
+
+def clear_tables(conn: Connection, tables: Sequence[str]) -> None:
+    """清空多张表：先整体校验表名，再在同一个事务内逐表 DELETE。"""
+    unknown = [t for t in tables if t not in TABLE_SCHEMAS]
+    if unknown:
+        raise ValueError(f"Unknown table: {', '.join(unknown)}")
+    # executescript 会先隐式提交当前事务，这里逐条执行以留在 batch 的事务内
+    with conn.batch():
+        for t in tables:
+            conn.clear(t)
+
+def insert_match_log(conn: Connection, rid_query: str, candidate_rids: List[str],
+                     pre_scores: List[Dict[str, Any]], final: Dict[str, Any], now: Optional[str] = None) -> None:
+    insert_match_logs(conn, [(rid_query, candidate_rids, pre_scores, final)], now=now)
+
+def insert_match_logs(conn: Connection,
+                      logs: List[Tuple[str, List[str], List[Dict[str, Any]], Dict[str, Any]]],
+                      now: Optional[str] = None) -> None:
+    """批量写入匹配日志，每项为 (rid_query, candidate_rids, pre_scores, final)。"""
+    now = now or _now_str()
+    rows = [
+        {
+            "rid_query": rid_query,
+            "candidate_rids_json": json_dumps(candidate_rids),
+            "pre_scores_json": json_dumps(pre_scores),
+            "final_json": json_dumps(final),
+            "created_at": now
+        }
+        for rid_query, candidate_rids, pre_scores, final in logs
+    ]
+    conn.insert_many("match_logs", rows)
 
-def write_clusters(conn: ExcelConnection, clusters: Dict[str, List[str]]) -> None:
+def write_clusters(conn: Connection, clusters: Dict[str, List[str]]) -> None:
     rows = []
     for cid, rids in clusters.items():
         for rid in rids:
             rows.append({"cluster_id": cid, "rid": rid})
-    conn.tables["clusters"] = pd.DataFrame(rows, columns=TABLE_SCHEMAS["clusters"])
-    conn.save()
+    conn.replace_all("clusters", rows)
 
-def upsert_road(conn: ExcelConnection, road_id: str, name: str, district: str | None, aliases: List[str]) -> None:
-    df = conn.tables["roads"]
-    row = {
+def upsert_road(conn: Connection, road_id: str, name: str, district: str | None, aliases: List[str]) -> None:
+    conn.upsert("roads", _road_row(road_id, name, district, aliases))
+
+def upsert_roads_many(conn: Connection, roads: List[Dict[str, Any]]) -> None:
+    """批量写入道路，每项为 seed_base_entities 形式的 dict。"""
+    conn.upsert_many("roads", [
+        _road_row(r["road_id"], r["name"], r.get("district"), r.get("aliases", [])) for r in roads
+    ])
+
+def _road_row(road_id: str, name: str, district: str | None, aliases: List[str]) -> Dict[str, Any]:
+    return {
         "road_id": road_id,
         "name": name,
         "district": district,
-        "aliases_json": json.dumps(aliases, ensure_ascii=False)
+        "aliases_json": json_dumps(aliases)
     }
-    df = _upsert_row(df, row, "road_id")
-    conn.tables["roads"] = df
-    conn.save()
 
-def upsert_poi(conn: ExcelConnection, poi_id: str, name: str, poi_type: str | None, district: str | None,
+def upsert_poi(conn: Connection, poi_id: str, name: str, poi_type: str | None, district: str | None,
                lat: float, lon: float, aliases: List[str]) -> None:
-    df = conn.tables["pois"]
-    row = {
+    conn.upsert("pois", _poi_row(poi_id, name, poi_type, district, lat, lon, aliases))
+
+def upsert_pois_many(conn: Connection, pois: List[Dict[str, Any]]) -> None:
+    """批量写入 POI，每项为 seed_base_entities 形式的 dict。"""
+    conn.upsert_many("pois", [
+        _poi_row(p["poi_id"], p["name"], p.get("poi_type"), p.get("district"), p["lat"], p["lon"], p.get("aliases", []))
+        for p in pois
+    ])
+
+def _poi_row(poi_id: str, name: str, poi_type: str | None, district: str | None,
+             lat: float, lon: float, aliases: List[str]) -> Dict[str, Any]:
+    return {
         "poi_id": poi_id,
         "name": name,
         "poi_type": poi_type,
         "district": district,
         "lat": lat,
         "lon": lon,
-        "aliases_json": json.dumps(aliases, ensure_ascii=False)
+        "aliases_json": json_dumps(aliases)
     }
-    df = _upsert_row(df, row, "poi_id")
-    conn.tables["pois"] = df
-    conn.save()
 
-def upsert_anchor(conn: ExcelConnection, anchor_id: str, anchor_type: str | None, key_text: str,
+def upsert_anchor(conn: Connection, anchor_id: str, anchor_type: str | None, key_text: str,
                   district: str | None, lat: float, lon: float) -> None:
-    df = conn.tables["anchors"]
-    row = {
+    conn.upsert("anchors", _anchor_row(anchor_id, anchor_type, key_text, district, lat, lon))
+
+def upsert_anchors_many(conn: Connection, anchors: List[Dict[str, Any]]) -> None:
+    """批量写入锚点，每项为 seed_base_entities 形式的 dict。"""
+    conn.upsert_many("anchors", [
+        _anchor_row(a["anchor_id"], a.get("anchor_type"), a["key_text"], a.get("district"), a["lat"], a["lon"])
+        for a in anchors
+    ])
+
+def _anchor_row(anchor_id: str, anchor_type: str | None, key_text: str,
+                district: str | None, lat: float, lon: float) -> Dict[str, Any]:
+    return {
         "anchor_id": anchor_id,
         "anchor_type": anchor_type,
         "key_text": key_text,
@@ -228,30 +713,15 @@ def upsert_anchor(conn: ExcelConnection, anchor_id: str, anchor_type: str | None
         "lat": lat,
         "lon": lon
     }
-    df = _upsert_row(df, row, "anchor_id")
-    conn.tables["anchors"] = df
-    conn.save()
-
-def find_anchor_by_key(conn: ExcelConnection, key_text: str) -> Optional[Dict[str, Any]]:
-    df = conn.tables["anchors"]
-    match = df[df["key_text"] == key_text]
-    if match.empty:
-        return None
-    return _row_to_dict(match.iloc[0])
 
-def insert_pair_labels(conn: ExcelConnection, labels: List[Tuple[str, str, int]]) -> None:
+def find_anchor_by_key(conn: Connection, key_text: str) -> Optional[Dict[str, Any]]:
+    return conn.fetch_one("anchors", "key_text", key_text)
+
+def insert_pair_labels(conn: Connection, labels: List[Tuple[str, str, int]]) -> None:
     if not labels:
         return
-    df = conn.tables["pair_labels"]
-    next_id = _next_pk(df)
-    rows = []
-    for rid1, rid2, label in labels:
-        rows.append({"id": next_id, "rid1": rid1, "rid2": rid2, "label": int(label)})
-        next_id += 1
-    df = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
-    conn.tables["pair_labels"] = df
-    conn.save()
-
-def list_pair_labels(conn: ExcelConnection) -> List[Dict[str, Any]]:
-    df = conn.tables["pair_labels"]
-    return [_row_to_dict(row) for _, row in df.iterrows()]
+    rows = [{"rid1": rid1, "rid2": rid2, "label": int(label)} for rid1, rid2, label in labels]
+    conn.insert_many("pair_labels", rows)
+
+def list_pair_labels(conn: Connection) -> List[Dict[str, Any]]:
+    return conn.fetch_all("pair_labels")
@@ -1,36 +1,109 @@
 from __future__ import annotations
 import json
-from typing import Any, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
 
 from .config import Config
-from .db import list_pair_labels, get_record, get_parsed
+from .db import list_pair_labels, get_records, get_parsed_many
 from .pipeline import _row_to_record, _row_to_parsed
-from .scoring import Scorer
+from .scoring import Scorer, weighted_scores
 
-def evaluate_current(conn, cfg: Config) -> Dict[str, Any]:
+def _label_features(conn, cfg: Config) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """逐条标注对计算一次特征分（与权重/阈值无关），返回 (特征名 -> 各标注对的特征分列, 标签列)"""
     labels = list_pair_labels(conn)
     scorer = Scorer(cfg.weights, cfg.thresholds)
 
-    tp=fp=tn=fn=0
+    # 标注涉及的记录与解析结果各批量读一次，每个 rid 只转换一次
+    rids = list(dict.fromkeys(rid for row in labels for rid in (row["rid1"], row["rid2"])))
+    rec_rows = get_records(conn, rids)
+    parsed_rows = get_parsed_many(conn, rids)
+    recs = {rid: _row_to_record(rec_rows.get(rid)) for rid in rids}
+    parsed = {rid: _row_to_parsed(parsed_rows.get(rid)) for rid in rids}
+
+    rows = []
+    ys = []
     for row in labels:
         rid1, rid2, y = row["rid1"], row["rid2"], int(row["label"])
-        r1 = _row_to_record(get_record(conn, rid1))
-        r2 = _row_to_record(get_record(conn, rid2))
-        p1 = _row_to_parsed(get_parsed(conn, rid1))
-        p2 = _row_to_parsed(get_parsed(conn, rid2))
-        ms = scorer.score_pair(r1, p1, r2, p2, relative_anchor_bonus=0.0)
-        pred = 1 if ms.decision == "SAME" else 0
-        if pred==1 and y==1: tp+=1
-        elif pred==1 and y==0: fp+=1
-        elif pred==0 and y==0: tn+=1
-        elif pred==0 and y==1: fn+=1
+        rows.append(scorer.score_pair_features(recs[rid1], parsed[rid1], recs[rid2], parsed[rid2], relative_anchor_bonus=0.0))
+        ys.append(y)
+
+    names = list(rows[0]) if rows else []
+    features = {k: np.array([float(fs.get(k, 0.0)) for fs in rows]) for k in names}
+    return features, np.array(ys, dtype=int)
+
+GridPoint = Tuple[Dict[str, float], Dict[str, float]]
+
+def _metrics(scores: np.ndarray, y: np.ndarray, thresholds: Dict[str, float]) -> Dict[str, Any]:
+    # 只有 SAME 视为正例预测，与 Scorer.score_pair 的阈值决策一致
+    pred = scores >= float(thresholds.get("same", 0.78))
+    tp = int(np.sum(pred & (y == 1)))
+    fp = int(np.sum(pred & (y == 0)))
+    tn = int(np.sum(~pred & (y == 0)))
+    fn = int(np.sum(~pred & (y == 1)))
+    return _metrics_from_counts(tp, fp, tn, fn)
 
+def _metrics_from_counts(tp: int, fp: int, tn: int, fn: int) -> Dict[str, Any]:
     prec = tp / (tp+fp) if (tp+fp) else 0.0
     rec  = tp / (tp+fn) if (tp+fn) else 0.0
     f1   = (2*prec*rec/(prec+rec)) if (prec+rec) else 0.0
     return {"tp":tp,"fp":fp,"tn":tn,"fn":fn,"precision":prec,"recall":rec,"f1":f1}
 
-def grid_search(conn, cfg: Config) -> Dict[str, Any]:
+def _grid_metrics(features: Dict[str, np.ndarray], y: np.ndarray, points: List[GridPoint]) -> List[Dict[str, Any]]:
+    """一次算完一批网格点：各网格点的指标与逐点调用 _metrics 相同。
+
+    得分只与权重有关，先对去重后的权重组合算出 (标注对数, 权重组合数) 得分矩阵，阈值不同的网格点共用同一列。
+    加权和按权重顺序逐列累加（与 weighted_scores 的求和顺序一致，得分逐位相同），不用矩阵乘法，
+    否则 BLAS 的求和顺序会让恰好落在阈值上的得分翻转。"""
+    if not points:
+        return []
+    columns: Dict[Tuple[Tuple[str, float], ...], int] = {}
+    col_of = [columns.setdefault(_weights_key(weights), len(columns)) for weights, _ in points]
+    uniq_weights = [dict(key) for key in columns]
+
+    keys = [k for k in uniq_weights[0] if k in features]
+    num = np.zeros((len(y), len(uniq_weights)))
+    for k in keys:
+        w = np.array([weights.get(k, 0.0) for weights in uniq_weights])
+        num += features[k][:, None] * w
+    denom = np.array([sum(max(0.0, v) for v in weights.values()) or 1.0 for weights in uniq_weights])
+    scores = num / denom
+
+    same = np.array([float(th.get("same", 0.78)) for _, th in points])
+    pred = scores[:, col_of] >= same
+
+    pos = (y == 1)[:, None]
+    neg = (y == 0)[:, None]
+    tp = np.sum(pred & pos, axis=0)
+    fp = np.sum(pred & neg, axis=0)
+    tn = np.sum(~pred & neg, axis=0)
+    fn = np.sum(~pred & pos, axis=0)
+    return [_metrics_from_counts(int(a), int(b), int(c), int(d)) for a, b, c, d in zip(tp, fp, tn, fn)]
+
+def _weights_key(weights: Dict[str, float]) -> Tuple[Tuple[str, float], ...]:
+    return tuple((k, float(v)) for k, v in weights.items())
+
+def evaluate_current(conn, cfg: Config) -> Dict[str, Any]:
+    features, y = _label_features(conn, cfg)
+    return _metrics(weighted_scores(features, len(y), cfg.weights), y, cfg.thresholds)
+
+# 进程池 worker 的只读状态：特征列与标签在 initializer 中传入一次，避免每个任务重复序列化
+_WORKER_STATE: Dict[str, Any] = {}
+
+def _init_worker(features: Dict[str, np.ndarray], y: np.ndarray) -> None:
+    _WORKER_STATE["features"] = features
+    _WORKER_STATE["y"] = y
+
+def _score_points(points: List[GridPoint]) -> List[Dict[str, Any]]:
+    return _grid_metrics(_WORKER_STATE["features"], _WORKER_STATE["y"], points)
+
+def _point_key(point: GridPoint) -> Tuple[Any, ...]:
+    weights, thresholds = point
+    return _weights_key(weights), float(thresholds.get("same", 0.78))
+
+def grid_search(conn, cfg: Config, workers: int = 1) -> Dict[str, Any]:
+    """在阈值 × 权重缩放网格上选 F1 最优点；workers > 1 时把网格点分块交给进程池并行评估。"""
     base_w = dict(cfg.weights)
     same_grid = [0.70, 0.74, 0.78, 0.82]
     unsure_grid = [0.50, 0.55, 0.60]
@@ -42,7 +115,7 @@ def grid_search(conn, cfg: Config) -> Dict[str, Any]:
         {"geo": 1.2, "building": 1.1, "aoi": 1.1},
     ]
 
-    best = {"f1": -1.0}
+    points = []
     for th_same in same_grid:
         for th_unsure in unsure_grid:
             if th_unsure >= th_same:
@@ -52,19 +125,34 @@ def grid_search(conn, cfg: Config) -> Dict[str, Any]:
                 for k, s in scale.items():
                     if k in w:
                         w[k] = float(w[k]) * float(s)
+                points.append((w, {"same": th_same, "unsure": th_unsure}))
 
-                cfg2 = Config(
-                    db_path=cfg.db_path,
-                    grid_precision=cfg.grid_precision,
-                    candidate_max=cfg.candidate_max,
-                    candidate_topn_for_llm=cfg.candidate_topn_for_llm,
-                    weights=w,
-                    thresholds={"same": th_same, "unsure": th_unsure},
-                    parser=cfg.parser
-                )
-                metrics = evaluate_current(conn, cfg2)
-                if metrics["f1"] > best["f1"]:
-                    best = {"f1": metrics["f1"], "precision": metrics["precision"], "recall": metrics["recall"],
-                            "tp": metrics["tp"], "fp": metrics["fp"], "tn": metrics["tn"], "fn": metrics["fn"],
-                            "thresholds": cfg2.thresholds, "weights": cfg2.weights}
+    # 特征分与权重/阈值无关：只读库、打分一次，各网格点只做加权求和与阈值比较
+    features, y = _label_features(conn, cfg)
+    # 指标只取决于权重与 same 阈值（unsure 不参与正例判定），相同的组合只评估一次
+    unique: Dict[Tuple[Any, ...], int] = {}
+    todo: List[GridPoint] = []
+    slots: List[int] = []
+    for point in points:
+        key = _point_key(point)
+        if key not in unique:
+            unique[key] = len(todo)
+            todo.append(point)
+        slots.append(unique[key])
+    if workers > 1:
+        # 每个任务整块向量化评估一段网格点
+        size = max(1, -(-len(todo) // workers))
+        chunks = [todo[i:i + size] for i in range(0, len(todo), size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(features, y)) as ex:
+            computed = [m for part in ex.map(_score_points, chunks) for m in part]
+    else:
+        computed = _grid_metrics(features, y, todo)
+    results = [computed[i] for i in slots]
+
+    best = {"f1": -1.0}
+    for (w, thresholds), metrics in zip(points, results):
+        if metrics["f1"] > best["f1"]:
+            best = {"f1": metrics["f1"], "precision": metrics["precision"], "recall": metrics["recall"],
+                    "tp": metrics["tp"], "fp": metrics["fp"], "tn": metrics["tn"], "fn": metrics["fn"],
+                    "thresholds": thresholds, "weights": w}
     return best
@@ -1,18 +1,15 @@
 from __future__ import annotations
-import json
 import logging
 import os
 import urllib.request
-from dataclasses import asdict
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from .models import AddressRecord, ParsedAddress, MatchResult, Conflict
-from .utils import jaccard_sim, haversine_m, geo_score
+from .utils import jaccard_sets, haversine_m, geo_score, json_dumps, json_dumps_bytes, json_loads
 
 
 logger = logging.getLogger(__name__)
 
-
 class ConflictChecker:
     """既用于单记录质量检查，也用于判定两条地址是否存在黑名单冲突。"""
 
@@ -69,12 +66,26 @@ class Judge:
         candidates: List[Tuple[AddressRecord, ParsedAddress]],
         pre_scores: List[MatchResult],
         use_llm: bool = False,
+        top_k: Optional[int] = None,
     ) -> MatchResult:
+        """规则白名单 -> （可选）LLM 裁决 -> 最高预评分兜底。
+
+        候选先按预评分降序排列（同分保持原顺序），top_k 给定时只考察前 top_k 个，LLM 载荷同样只含这些候选。
+        """
         (qr, qp) = query
+        if candidates:
+            ranked = sorted(zip(candidates, pre_scores), key=lambda x: x[1].score, reverse=True)[:top_k]
+            candidates = [c for c, _ in ranked]
+            pre_scores = [ms for _, ms in ranked]
         best = None
         best_idx = 0
         last_conflict_reason: Optional[str] = None
 
+        # 查询侧字段只需处理一次，循环内只处理候选侧
+        q_building = qp.building_upper
+        q_aoi_grams = qp.aoi_ngrams[0]
+        q_has_geo = qr.lat is not None and qr.lon is not None
+
         for i, ((cr, cp), ms) in enumerate(zip(candidates, pre_scores)):
             conflict_reason = self.blacklist_checker.pair_conflict_reason(qr, qp, cr, cp)
             if conflict_reason:
@@ -82,13 +93,13 @@ class Judge:
                 last_conflict_reason = conflict_reason
                 continue
 
-            building_ok = qp.building and cp.building and qp.building.upper() == cp.building.upper()
+            building_ok = q_building and cp.building and q_building == cp.building_upper
             floor_ok = qp.floor and cp.floor and qp.floor == cp.floor
             room_ok = qp.room and cp.room and qp.room == cp.room
-            aoi_ok = qp.aoi and cp.aoi and jaccard_sim(qp.aoi, cp.aoi, 2) >= 0.65
+            aoi_ok = q_aoi_grams and cp.aoi and jaccard_sets(q_aoi_grams, cp.aoi_ngrams[0]) >= 0.65
 
             geo_ok = 0.0
-            if qr.lat is not None and qr.lon is not None and cr.lat is not None and cr.lon is not None:
+            if q_has_geo and cr.lat is not None and cr.lon is not None:
                 geo_ok = geo_score(haversine_m(qr.lat, qr.lon, cr.lat, cr.lon))
 
             if building_ok and floor_ok and (room_ok or geo_ok >= 0.7 or aoi_ok):
@@ -100,7 +111,8 @@ class Judge:
                     evidence={"judge": "rule_whitelist", "best_rid": cr.rid},
                 )
 
-            if best is None or ms.score > best.score:
+            # 已按预评分降序，第一个未被黑名单拒绝的候选即为最高分
+            if best is None:
                 best = ms
                 best_idx = i
 
@@ -153,9 +165,16 @@ class Judge:
             return None
 
         payload = {
-            "query": {"record": asdict(query[0]), "parsed": asdict(query[1])},
+            "query": {
+                "record": query[0].to_dict(),
+                "parsed": query[1].to_dict(),
+            },
             "candidates": [
-                {"record": asdict(rec), "parsed": asdict(parsed), "pre_score": ms.score}
+                {
+                    "record": rec.to_dict(),
+                    "parsed": parsed.to_dict(),
+                    "pre_score": ms.score,
+                }
                 for (rec, parsed), ms in zip(candidates, pre_scores)
             ],
         }
@@ -163,9 +182,9 @@ class Judge:
             "你是地址匹配裁判。根据输入的结构化字段判断两条地址是否描述同一实体。"
             '仅返回 JSON，例如 {"decision": "SAME", "best_idx": 0, "reason": "...", "score": 0.9}。'
         )
-        user = json.dumps(payload, ensure_ascii=False)
+        user = json_dumps(payload)
 
-        body = json.dumps(
+        body = json_dumps_bytes(
             {
                 "model": self.llm_model,
                 "messages": [
@@ -174,7 +193,7 @@ class Judge:
                 ],
                 "temperature": 0.0,
             }
-        ).encode("utf-8")
+        )
 
         req = urllib.request.Request(f"{self.llm_base_url}/chat/completions", data=body, method="POST")
         req.add_header("Content-Type", "application/json")
@@ -182,9 +201,9 @@ class Judge:
 
         try:
             with urllib.request.urlopen(req, timeout=30) as resp:
-                data = json.loads(resp.read().decode("utf-8"))
+                data = json_loads(resp.read())
             content = data["choices"][0]["message"]["content"]
-            obj = json.loads(content)
+            obj = json_loads(content)
         except Exception as exc:
             logger.exception("LLM judge request failed: %s", exc)
             return None
@@ -1,6 +1,9 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
-from typing import Any, Dict, Optional, Tuple
+from dataclasses import dataclass, field, fields
+from functools import cached_property
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from .utils import _ngrams
 
 @dataclass
 class AddressRecord:
@@ -13,6 +16,10 @@ class AddressRecord:
     lon: Optional[float] = None
     extra: Dict[str, Any] = field(default_factory=dict)
 
+    def to_dict(self) -> Dict[str, Any]:
+        """字段 -> 值的浅层 dict（不像 asdict 那样递归深拷贝）"""
+        return {name: getattr(self, name) for name in _RECORD_FIELDS}
+
 @dataclass
 class ParsedAddress:
     norm_text: str
@@ -32,6 +39,33 @@ class ParsedAddress:
     direction: Optional[str] = None
     distance_m: Optional[int] = None
 
+    def to_dict(self) -> Dict[str, Any]:
+        """字段 -> 值的浅层 dict；只取 dataclass 字段，不含下面缓存的派生特征"""
+        return {name: getattr(self, name) for name in _PARSED_FIELDS}
+
+    # 评分用的派生特征：首次访问时计算并缓存在实例上（不是 dataclass 字段，不参与序列化/比较/repr）。
+    # 一条记录会与 K 个候选比较，只需算一次；须在字段赋值（含别名归一）完成后再访问。
+    @cached_property
+    def building_upper(self) -> str:
+        return self.building.upper() if self.building else ""
+
+    @cached_property
+    def aoi_ngrams(self) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        """(2-gram, 3-gram)"""
+        return _ngrams(self.aoi or "", 2), _ngrams(self.aoi or "", 3)
+
+    @cached_property
+    def road_ngrams(self) -> FrozenSet[str]:
+        return _ngrams(self.road or "", 2)
+
+    @cached_property
+    def shop_ngrams(self) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        """(2-gram, 3-gram)"""
+        return _ngrams(self.shop_name or "", 2), _ngrams(self.shop_name or "", 3)
+
+_RECORD_FIELDS = tuple(f.name for f in fields(AddressRecord))
+_PARSED_FIELDS = tuple(f.name for f in fields(ParsedAddress))
+
 @dataclass
 class MatchResult:
     decision: str
@@ -1,13 +1,21 @@
 from __future__ import annotations
+import asyncio
+import atexit
+import functools
+import hashlib
+import importlib.util
 import json
 import logging
 import os
-import urllib.request
-from dataclasses import fields as dataclass_fields
-from typing import List
+import threading
+from dataclasses import dataclass, fields as dataclass_fields
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import httpx
+
+from .db import LLMResponseCache
 from .models import ParsedAddress
-from .utils import normalize_text
+from .utils import json_dumps_bytes, json_loads, normalize_text
 
 
 logger = logging.getLogger(__name__)
@@ -33,31 +41,266 @@ LLM_ASSIGN_FIELDS = tuple(
     for f in dataclass_fields(ParsedAddress)
     if f.name not in {"norm_text", "intersection"}
 )
+# 提示词中的示例 JSON，文本固定，导入时生成一次
+LLM_PARSE_SCHEMA_HINT_JSON = json.dumps(LLM_PARSE_SCHEMA_HINT, ensure_ascii=False)
+# 提示词版本：修改下方提示词或示例时递增，旧的缓存结果随之失效
+LLM_PROMPT_VERSION = "3"
+# 系统提示词（含示例 JSON）按字节固定、放在消息最前，逐条/批量请求共享同一前缀，可命中服务端的提示词前缀缓存；
+# 随地址变化的内容只放在 user 消息里
+LLM_PARSE_SYSTEM_PROMPT = (
+    "你是地址结构化解析器。必须返回合法 JSON 字符串，不得包含注释或多余文字。\n"
+    "字段：province, city, district, road, road_no, aoi, building, floor, room, shop_name, "
+    "intersection(长度恰好为 2 的数组), direction, distance_m。\n"
+    "若字段缺失请置为 null。\n"
+    f"示例：{LLM_PARSE_SCHEMA_HINT_JSON}"
+)
+LLM_BATCH_SYSTEM_PROMPT = (
+    "你是地址结构化解析器。请按输入顺序解析多个地址，返回 JSON 对象 {\"results\": [...]}，results 长度与输入一致。\n"
+    "每个元素须包含：province, city, district, road, road_no, aoi, building, floor, room, shop_name, "
+    "intersection(数组且长度为 2), direction, distance_m。\n"
+    "若字段缺失请填 null。只输出 JSON，不要其他文字。\n"
+    f"示例输出：{{\"results\": [{LLM_PARSE_SCHEMA_HINT_JSON}]}}"
+)
+# parse_batch 每个请求最多携带的地址数，控制单次输入/输出长度
+LLM_BATCH_GROUP_SIZE = 10
+# LLM 可能把门牌/楼层/房号返回为数字，统一转成字符串
+LLM_STR_FIELDS = frozenset({"road_no", "floor", "room"})
+
+# 并发解析时的重试策略：网络错误与限流/服务端错误按指数退避重试
+LLM_MAX_ATTEMPTS = 3
+LLM_BACKOFF_BASE_S = 0.5
+LLM_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# 连接复用参数；HTTP/2 需要 h2 包（pip install address_audit[http2]），未安装时使用 HTTP/1.1 keep-alive
+LLM_TIMEOUT = httpx.Timeout(30, connect=10)
+LLM_HTTP2 = importlib.util.find_spec("h2") is not None
+LLM_LIMITS = httpx.Limits(max_connections=40, max_keepalive_connections=20)
+
+# 同步请求在进程内共用一个连接池（各解析器实例共享），首次请求时创建、退出时关闭，避免重复 TCP/TLS 握手
+_CLIENT: Optional[httpx.Client] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def _shared_client() -> httpx.Client:
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = httpx.Client(http2=LLM_HTTP2, timeout=LLM_TIMEOUT, limits=LLM_LIMITS)
+                atexit.register(_CLIENT.close)
+    return _CLIENT
+
+
+@dataclass(frozen=True)
+class LLMEndpoint:
+    """一个 OpenAI 规范的接口地址及其并发上限；模型名与主接口相同。"""
+    base_url: str
+    api_key: str
+    max_concurrency: int = 8
+
+
+def _extra_endpoints_from_env() -> List[LLMEndpoint]:
+    # OPENAI_EXTRA_ENDPOINTS：JSON 数组，如 [{"base_url": "...", "api_key": "...", "max_concurrency": 4}]
+    raw = os.getenv("OPENAI_EXTRA_ENDPOINTS", "").strip()
+    if not raw:
+        return []
+    return [
+        LLMEndpoint(str(e["base_url"]).rstrip("/"), str(e["api_key"]), int(e.get("max_concurrency", 8)))
+        for e in json_loads(raw)
+    ]
+
+
+def _can_fail_over(exc: Exception) -> bool:
+    # 网络错误与限流/服务端错误换接口重试；其余错误（如 400 请求无效）换接口也不会成功
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in LLM_RETRY_STATUS
+    return isinstance(exc, httpx.TransportError)
 
 
 class OpenAILLMParser:
     """LLM 解析器，支持单条或批量地址的结构化解析。"""
 
-    def __init__(self) -> None:
+    def __init__(self, cache_path: Optional[str] = None, extra_endpoints: Optional[List[LLMEndpoint]] = None) -> None:
         self.base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
         self.model = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+        # parse_many 同时在途的请求数上限，按账号 RPM 配额调整
+        self.max_concurrency = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+        # 并发解析时与主接口分担负载的其他接口；某个接口出错时请求转到其余接口
+        self.extra_endpoints = list(extra_endpoints) if extra_endpoints is not None else _extra_endpoints_from_env()
+        # 解析结果缓存：按 (模型, 归一化地址) 复用 LLM 返回；给定 cache_path 时落盘到 SQLite，跨运行仍可命中
+        self.cache = LLMResponseCache(cache_path)
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
+        # 缓存键 -> 正在进行的异步解析请求
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def close(self) -> None:
+        self.cache.close()
+
+    async def aclose(self) -> None:
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+            self._aclient_loop = None
 
     def parse(self, raw: str) -> ParsedAddress:
-        api_key = self._require_key()
-        logger.debug("LLM parsing single address")
-        obj = self._request_single(raw or "", api_key)
+        key = self._cache_key(raw or "")
+        obj = self.cache.get(key)
+        if obj is None:
+            api_key = self._require_key()
+            logger.debug("LLM parsing single address")
+            obj = self._request_single(raw or "", api_key)
+            self.cache.put(key, obj)
         return self._build_parsed(raw or "", obj)
 
-    def parse_batch(self, raws: List[str]) -> List[ParsedAddress]:
+    def parse_batch(self, raws: List[str], group_size: int = LLM_BATCH_GROUP_SIZE) -> List[ParsedAddress]:
+        """多个地址合并到一个请求中解析，每 group_size 条一组；某组返回条数不符时该组改为逐条请求"""
         if not raws:
             return []
-        api_key = self._require_key()
-        logger.debug("LLM parsing batch size=%d", len(raws))
-        results = self._request_batch(raws, api_key)
-        parsed: List[ParsedAddress] = []
-        for raw, obj in zip(raws, results):
-            parsed.append(self._build_parsed(raw or "", obj or {}))
-        return parsed
+        keys, found, misses = self._lookup(raws)
+        if misses:
+            api_key = self._require_key()
+            items = list(misses.items())
+            step = max(1, group_size)
+            logger.debug("LLM parsing batch size=%d (unique uncached of %d)", len(items), len(raws))
+            for start in range(0, len(items), step):
+                group = items[start:start + step]
+                results = self._request_batch([raw for _, raw in group], api_key)
+                if results is None:
+                    logger.warning("LLM batch result malformed, falling back to single requests (size=%d)", len(group))
+                    results = [self._request_single(raw, api_key) for _, raw in group]
+                for (key, _), obj in zip(group, results):
+                    if isinstance(obj, dict):
+                        found[key] = obj
+                        self.cache.put(key, obj)
+        return [self._build_parsed(raw or "", found.get(key) or {}) for raw, key in zip(raws, keys)]
+
+    def parse_many(self, raws: List[str], return_exceptions: bool = False) -> List[Optional[ParsedAddress]]:
+        """逐条解析多个地址（每条一个请求），请求并发发出；结果与 parse 逐条调用一致、顺序不变。
+        return_exceptions=True 时单条失败只记日志、对应位置返回 None，不影响其余地址。"""
+        if not raws:
+            return []
+        return asyncio.run(self._parse_many_scoped(raws, return_exceptions))
+
+    async def _parse_many_scoped(self, raws: List[str], return_exceptions: bool) -> List[Optional[ParsedAddress]]:
+        # asyncio.run 每次新建事件循环，异步客户端随之创建并在本次结束时关闭
+        async with self._new_async_client() as client:
+            return await self._aparse_many(raws, client, return_exceptions)
+
+    async def aparse(self, raw: str) -> ParsedAddress:
+        return (await self.aparse_many([raw]))[0]
+
+    async def aparse_many(self, raws: List[str], return_exceptions: bool = False) -> List[Optional[ParsedAddress]]:
+        """在调用方的事件循环中并发解析；同一事件循环内的多次调用共用一个异步连接池（如 FastAPI 的各个请求）"""
+        return await self._aparse_many(raws, self._async_client(), return_exceptions)
+
+    async def _aparse_many(
+        self, raws: List[str], client: httpx.AsyncClient, return_exceptions: bool = False
+    ) -> List[Optional[ParsedAddress]]:
+        if not raws:
+            return []
+        # 事件循环中只查内存层；未命中的一次性放到线程里查 SQLite，不阻塞其他请求
+        keys, found, misses = self._lookup(raws, self.cache.peek)
+        if misses and self.cache.raw is not None:
+            stored = await asyncio.to_thread(self.cache.get_many, list(misses))
+            for key, obj in stored.items():
+                found[key] = obj
+                del misses[key]
+        if misses:
+            endpoints = [LLMEndpoint(self.base_url, self._require_key(), self.max_concurrency), *self.extra_endpoints]
+            logger.debug("LLM parsing %d unique uncached of %d addresses concurrently", len(misses), len(raws))
+            sems = [asyncio.Semaphore(max(1, ep.max_concurrency)) for ep in endpoints]
+            # 各接口已分配（含排队中）的请求数，新请求交给空闲名额最多的接口
+            load = [0] * len(endpoints)
+            loop = asyncio.get_running_loop()
+
+            async def one(key: str, raw: str) -> dict:
+                payload = self._single_payload(raw)
+                untried = list(range(len(endpoints)))
+                while True:
+                    i = max(untried, key=lambda j: endpoints[j].max_concurrency - load[j])
+                    untried.remove(i)
+                    ep = endpoints[i]
+                    load[i] += 1
+                    try:
+                        async with sems[i]:
+                            # 还有备用接口时只请求一次，出错直接换接口；最后一个接口按完整的退避策略重试
+                            attempts = 1 if untried else LLM_MAX_ATTEMPTS
+                            resp = await self._acall_openai(client, payload, ep.api_key, ep.base_url, attempts)
+                        break
+                    except (httpx.TransportError, httpx.HTTPStatusError) as exc:
+                        if not untried or not _can_fail_over(exc):
+                            raise
+                        logger.warning("LLM endpoint %s failed (%s), failing over", ep.base_url, exc)
+                    finally:
+                        load[i] -= 1
+                obj = self._extract_obj(resp)
+                # 落盘写入放到线程里，不在事件循环中等 SQLite
+                await asyncio.to_thread(self.cache.put, key, obj)
+                return obj
+
+            # 同一地址已有并发调用在请求时直接等待其结果（如多个 /compare 同时解析同一地址），不重复请求；
+            # shield 保证某个调用方被取消时不会连带取消其他调用方在等的请求
+            tasks = []
+            for key, raw in misses.items():
+                task = self._inflight.get(key)
+                if task is None or task.get_loop() is not loop:
+                    task = loop.create_task(one(key, raw))
+                    self._inflight[key] = task
+                    task.add_done_callback(functools.partial(self._forget_inflight, key))
+                tasks.append(asyncio.shield(task))
+
+            results = await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+            for (key, raw), obj in zip(misses.items(), results):
+                if isinstance(obj, BaseException):
+                    logger.warning("LLM parsing failed for %r: %s", raw, obj)
+                    continue
+                found[key] = obj
+        return [
+            self._build_parsed(raw or "", found[key]) if key in found else None
+            for raw, key in zip(raws, keys)
+        ]
+
+    def _forget_inflight(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def _new_async_client(self) -> httpx.AsyncClient:
+        # 一个客户端按主机分别维护连接池，多个接口共用；总连接数取各接口并发上限之和
+        total = self.max_concurrency + sum(ep.max_concurrency for ep in self.extra_endpoints)
+        limits = httpx.Limits(max_connections=total, max_keepalive_connections=total)
+        return httpx.AsyncClient(http2=LLM_HTTP2, timeout=LLM_TIMEOUT, limits=limits)
+
+    def _async_client(self) -> httpx.AsyncClient:
+        # AsyncClient 绑定创建它的事件循环，换了循环就重建
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = self._new_async_client()
+            self._aclient_loop = loop
+        return self._aclient
+
+    def _cache_key(self, raw: str) -> str:
+        key = f"{self.model}\x1f{LLM_PROMPT_VERSION}\x1f{normalize_text(raw)}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _lookup(
+        self, raws: List[str], get: Optional[Callable[[str], Any]] = None
+    ) -> Tuple[List[str], Dict[str, dict], Dict[str, str]]:
+        """返回各地址的缓存键、已命中的 键 -> 解析结果，以及未命中的 键 -> 原始地址（归一化后相同的地址只请求一次）；
+        get 为查缓存的函数，默认 self.cache.get"""
+        get = get or self.cache.get
+        keys = [self._cache_key(raw or "") for raw in raws]
+        found: Dict[str, dict] = {}
+        misses: Dict[str, str] = {}
+        for raw, key in zip(raws, keys):
+            if key in found or key in misses:
+                continue
+            obj = get(key)
+            if obj is None:
+                misses[key] = raw or ""
+            else:
+                found[key] = obj
+        return keys, found, misses
 
     def _require_key(self) -> str:
         api_key = os.getenv("OPENAI_API_KEY", "")
@@ -66,42 +309,28 @@ class OpenAILLMParser:
         return api_key
 
     def _request_single(self, raw: str, api_key: str) -> dict:
-        system = (
-            "你是地址结构化解析器。必须返回合法 JSON 字符串，不得包含注释或多余文字。\n"
-            "字段：province, city, district, road, road_no, aoi, building, floor, room, shop_name, "
-            "intersection(长度恰好为 2 的数组), direction, distance_m。\n"
-            "若字段缺失请置为 null。"
-        )
-        user = (
-            "请把以下地址解析为 JSON：\n"
-            f"raw=\"{raw}\"\n"
-            f"示例：{json.dumps(LLM_PARSE_SCHEMA_HINT, ensure_ascii=False)}"
-        )
-        payload = self._chat_payload(system, user)
-        resp = self._call_openai(payload, api_key)
+        resp = self._call_openai(self._single_payload(raw), api_key)
         return self._extract_obj(resp)
 
-    def _request_batch(self, raws: List[str], api_key: str) -> List[dict]:
+    def _single_payload(self, raw: str) -> dict:
+        user = f"请把以下地址解析为 JSON：\nraw=\"{raw}\""
+        return self._chat_payload(LLM_PARSE_SYSTEM_PROMPT, user)
+
+    def _request_batch(self, raws: List[str], api_key: str) -> Optional[List[dict]]:
+        """返回与 raws 等长的解析结果；返回内容不是等长数组时返回 None"""
         addr_lines = "\n".join(f"{idx+1}. {text}" for idx, text in enumerate(raws))
-        system = (
-            "你是地址结构化解析器。请按输入顺序解析多个地址，并返回 JSON 数组，数组长度与输入一致。\n"
-            "每个元素须包含：province, city, district, road, road_no, aoi, building, floor, room, shop_name, "
-            "intersection(数组且长度为 2), direction, distance_m。\n"
-            "若字段缺失请填 null。只输出 JSON 数组，不要其他文字。"
-        )
-        user = (
-            f"地址列表：\n{addr_lines}\n"
-            f"示例输出：[{json.dumps(LLM_PARSE_SCHEMA_HINT, ensure_ascii=False)}]"
-        )
-        payload = self._chat_payload(system, user)
+        user = f"地址列表：\n{addr_lines}"
+        payload = self._chat_payload(LLM_BATCH_SYSTEM_PROMPT, user, json_object=True)
         resp = self._call_openai(payload, api_key)
         data = self._extract_obj(resp)
-        if not isinstance(data, list):
-            raise ValueError("LLM 返回结果不是 JSON 数组")
+        if isinstance(data, dict):
+            data = data.get("results")
+        if not isinstance(data, list) or len(data) != len(raws):
+            return None
         return data
 
-    def _chat_payload(self, system: str, user: str) -> dict:
-        return {
+    def _chat_payload(self, system: str, user: str, json_object: bool = False) -> dict:
+        payload = {
             "model": self.model,
             "messages": [
                 {"role": "system", "content": system},
@@ -109,26 +338,54 @@ class OpenAILLMParser:
             ],
             "temperature": 0.0,
         }
+        if json_object:
+            # JSON 模式要求顶层为对象，批量结果包在 results 中
+            payload["response_format"] = {"type": "json_object"}
+        return payload
 
     def _call_openai(self, payload: dict, api_key: str) -> dict:
-        url = f"{self.base_url}/chat/completions"
-        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
-        req = urllib.request.Request(url, data=data, method="POST")
-        req.add_header("Content-Type", "application/json")
-        req.add_header("Authorization", f"Bearer {api_key}")
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            out = resp.read().decode("utf-8")
-        return json.loads(out)
+        data = json_dumps_bytes(payload)
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+        resp = _shared_client().post(f"{self.base_url}/chat/completions", content=data, headers=headers)
+        resp.raise_for_status()
+        return json_loads(resp.content)
+
+    async def _acall_openai(
+        self,
+        client: httpx.AsyncClient,
+        payload: dict,
+        api_key: str,
+        base_url: Optional[str] = None,
+        attempts: int = LLM_MAX_ATTEMPTS,
+    ) -> dict:
+        url = f"{base_url or self.base_url}/chat/completions"
+        data = json_dumps_bytes(payload)
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+        for attempt in range(attempts - 1):
+            try:
+                resp = await client.post(url, content=data, headers=headers)
+                if resp.status_code not in LLM_RETRY_STATUS:
+                    break
+            except httpx.TransportError:
+                pass
+            delay = LLM_BACKOFF_BASE_S * (2 ** attempt)
+            logger.debug("LLM request retry in %.1fs (attempt %d)", delay, attempt + 1)
+            await asyncio.sleep(delay)
+        else:
+            # 最后一次不再重试，异常/错误状态码直接抛出
+            resp = await client.post(url, content=data, headers=headers)
+        resp.raise_for_status()
+        return json_loads(resp.content)
 
     def _extract_obj(self, response: dict) -> dict:
         content = response["choices"][0]["message"]["content"]
-        return json.loads(content)
+        return json_loads(content)
 
     def _build_parsed(self, raw: str, obj: dict) -> ParsedAddress:
         parsed = ParsedAddress(norm_text=normalize_text(raw))
         for key in LLM_ASSIGN_FIELDS:
             if key in obj and obj[key] not in (None, ""):
-                value = str(obj[key]) if key in {"road_no", "floor", "room"} else obj[key]
+                value = str(obj[key]) if key in LLM_STR_FIELDS else obj[key]
                 setattr(parsed, key, value)
         if isinstance(obj.get("intersection"), list) and len(obj["intersection"]) == 2:
             parsed.intersection = (obj["intersection"][0], obj["intersection"][1])
@@ -1,7 +1,7 @@
 from __future__ import annotations
-import json
+import asyncio
+import heapq
 import logging
-from dataclasses import asdict
 from typing import Any, Dict, List, Optional, Set, Tuple
 
 from .config import Config
@@ -10,12 +10,12 @@ from .db import (
     connect,
     init_db,
     list_records,
-    upsert_parsed,
-    insert_match_log,
+    upsert_parsed_many,
+    insert_match_logs,
     write_clusters,
-    get_parsed,
-    get_record,
+    get_parsed_many,
     find_anchor_by_key,
+    _now_str,
 )
 from .base_data import load_alias_map
 from .parser_llm import OpenAILLMParser
@@ -23,6 +23,7 @@ from .candidates import CandidateGenerator
 from .scoring import Scorer
 from .judge import Judge, ConflictChecker
 from .clustering import UnionFind
+from .utils import json_loads, normalize_text
 
 
 logger = logging.getLogger(__name__)
@@ -36,42 +37,78 @@ class AddressGovernancePipeline:
         aoi_alias = load_alias_map(f"{data_dir}/alias_aoi.json")
         road_alias = load_alias_map(f"{data_dir}/alias_road.json")
 
-        self.parser = OpenAILLMParser()
+        self.parser = OpenAILLMParser(cache_path=cfg.parser.get("llm_cache_path", f"{data_dir}/llm_cache.sqlite"))
         self.cand_gen = CandidateGenerator(cfg.grid_precision, aoi_alias, road_alias)
         self.scorer = Scorer(cfg.weights, cfg.thresholds)
         self.judge = Judge()
         self.conflict_checker = ConflictChecker()
         self.default_judge_use_llm = bool(cfg.parser.get("judge_use_llm", False))
 
+    def warmup(self) -> None:
+        """用一对内置样例地址走一遍评分 + 规则裁决（不调用 LLM），把首次调用的一次性开销
+        （numba 即时编译、n-gram 缓存等）提前到启动阶段，服务的第一个请求不再承担。"""
+        rec1 = AddressRecord(rid="warmup_1", source="warmup", raw_address="合肥市蜀山区创新大道100号高新创新园A座2楼203室",
+                             lat=31.8200, lon=117.1299)
+        rec2 = AddressRecord(rid="warmup_2", source="warmup", raw_address="蜀山区高新创新园A座203",
+                             lat=31.8201, lon=117.1300)
+        parsed1 = ParsedAddress(norm_text=normalize_text(rec1.raw_address), district="蜀山区", road="创新大道",
+                                road_no="100", aoi="高新创新园", building="A座", floor="2", room="203")
+        parsed2 = ParsedAddress(norm_text=normalize_text(rec2.raw_address), district="蜀山区",
+                                aoi="高新创新园", building="A座", room="203")
+        score = self.scorer.score_pair(rec1, parsed1, rec2, parsed2, relative_anchor_bonus=0.0)
+        self.scorer.score_candidates(rec1, parsed1, [(rec2, parsed2)], [0.0])
+        self.judge.judge((rec1, parsed1), [(rec2, parsed2)], [score], use_llm=False)
+
     def run(self) -> Dict[str, Any]:
         conn = connect(self.cfg.db_path)
         init_db(conn)
 
+        # 本次运行写入的解析结果与匹配日志共用一个时间戳
+        now = _now_str()
         rec_rows = list_records(conn)
         records: List[AddressRecord] = []
         parsed: Dict[str, ParsedAddress] = {}
+        pending: List[AddressRecord] = []
 
         logger.info("Pipeline run started, records=%d", len(rec_rows))
+        # 已有解析结果一次批量读出；之后召回/打分阶段只查内存中的 records_by_rid / parsed
+        parsed_rows = get_parsed_many(conn, [row["rid"] for row in rec_rows])
         for row in rec_rows:
             rec = _row_to_record(row)
             records.append(rec)
 
-            cached = get_parsed(conn, rec.rid)
+            cached = parsed_rows.get(rec.rid)
             if cached:
                 logger.debug("Reuse cached parsing for %s", rec.rid)
                 parsed[rec.rid] = _row_to_parsed(cached)
             else:
-                logger.debug("Parse new address for %s", rec.rid)
-                p = self._normalize_parsed_fields(self.parser.parse(rec.raw_address))
-                upsert_parsed(conn, rec.rid, p)
-                parsed[rec.rid] = p
-
-
+                pending.append(rec)
+
+        # 未缓存的地址一次性并发解析，避免逐条串行等待 LLM 往返；解析阶段不开写事务，
+        # 单条失败只记录 rid 并跳过，本次不参与匹配，下次运行再解析
+        new_parsed: List[Tuple[str, ParsedAddress]] = []
+        failed: List[str] = []
+        if pending:
+            logger.debug("Parse %d new addresses", len(pending))
+            results = self.parser.parse_many([rec.raw_address for rec in pending], return_exceptions=True)
+            for rec, p in zip(pending, results):
+                if p is None:
+                    failed.append(rec.rid)
+                    continue
+                parsed[rec.rid] = self._normalize_parsed_fields(p)
+                new_parsed.append((rec.rid, parsed[rec.rid]))
+            if failed:
+                logger.warning("LLM parsing failed for %d records, skipped this run: %s", len(failed), ", ".join(failed))
+                records = [rec for rec in records if rec.rid in parsed]
+
+        records_by_rid: Dict[str, AddressRecord] = {rec.rid: rec for rec in records}
         pairs = [(rec, parsed[rec.rid]) for rec in records]
         indexes = self.cand_gen.build_indexes(pairs)
 
         uf = UnionFind([rec.rid for rec in records])
         seen: Set[str] = set()
+        # 匹配日志先在内存中累积，循环结束后一次批量写入
+        match_logs: List[Tuple[str, List[str], List[Dict[str, Any]], Dict[str, Any]]] = []
 
         for rec in records:
             pr = parsed[rec.rid]
@@ -90,26 +127,24 @@ class AddressGovernancePipeline:
                 continue
 
             cand_pairs: List[Tuple[AddressRecord, ParsedAddress]] = []
-            pre_scores = []
+            bonuses: List[float] = []
+            # 锚点邻域对本条查询的所有候选相同，只构造一次
+            anchor_cells = frozenset(self.cand_gen.geo_neighbors(anchor_bucket)) if anchor_bucket else None
             for cid in cands:
-                cr = _row_to_record(get_record(conn, cid))
-                cp = parsed[cid]
+                cr = records_by_rid[cid]
                 bonus = 0.0
-                if anchor_bucket and cr.lat is not None and cr.lon is not None:
-                    gb = self.cand_gen.geo_bucket(cr.lat, cr.lon)
-                    if gb and gb in set(self.cand_gen.geo_neighbors(anchor_bucket)):
+                if anchor_cells and cr.lat is not None and cr.lon is not None:
+                    gb = self.cand_gen.record_bucket(cr)
+                    if gb and gb in anchor_cells:
                         bonus = 1.0
-                score = self.scorer.score_pair(rec, pr, cr, cp, relative_anchor_bonus=bonus)
-                cand_pairs.append((cr, cp))
-                pre_scores.append(score)
-
-            ranked = sorted(
-                list(zip(cand_pairs, pre_scores)),
-                key=lambda x: x[1].score,
-                reverse=True,
-            )[: self.cfg.candidate_topn_for_llm]
-            top_pairs = [item[0] for item in ranked]
-            top_scores = [item[1] for item in ranked]
+                cand_pairs.append((cr, parsed[cid]))
+                bonuses.append(bonus)
+            pre_scores = self.scorer.score_candidates(rec, pr, cand_pairs, bonuses)
+
+            # 部分选择取前 topn（O(K log topn)）；nlargest 同分时保持召回顺序，与 sorted(..., reverse=True)[:topn] 一致
+            order = heapq.nlargest(self.cfg.candidate_topn_for_llm, range(len(pre_scores)), key=lambda i: pre_scores[i].score)
+            top_pairs = [cand_pairs[i] for i in order]
+            top_scores = [pre_scores[i] for i in order]
 
             final = self.judge.judge(
                 (rec, pr),
@@ -127,11 +162,10 @@ class AddressGovernancePipeline:
                 if best_rid:
                     uf.union(rec.rid, best_rid)
 
-            insert_match_log(
-                conn,
-                rid_query=rec.rid,
-                candidate_rids=[cr.rid for (cr, _) in top_pairs],
-                pre_scores=[
+            match_logs.append((
+                rec.rid,
+                [cr.rid for (cr, _) in top_pairs],
+                [
                     {
                         "rid": cr.rid,
                         "decision": ms.decision,
@@ -140,18 +174,23 @@ class AddressGovernancePipeline:
                     }
                     for (cr, _), ms in zip(top_pairs, top_scores)
                 ],
-                final={
+                {
                     "decision": final.decision,
                     "score": round(final.score, 4),
                     "evidence": final.evidence,
                 },
-            )
+            ))
 
             seen.add(rec.rid)
 
         groups = uf.groups()
         clusters: Dict[str, List[str]] = {f"cluster_{root}": members for root, members in groups.items()}
-        write_clusters(conn, clusters)
+
+        # 写入集中在最后一个 batch 中：只在结束时落盘一次，写事务也不跨越 LLM 请求
+        with conn.batch():
+            upsert_parsed_many(conn, new_parsed, now=now)
+            insert_match_logs(conn, match_logs, now=now)
+            write_clusters(conn, clusters)
         logger.info("Pipeline run completed, clusters=%d", len(clusters))
 
         return {
@@ -161,11 +200,37 @@ class AddressGovernancePipeline:
 
     def compare_addresses(self, addr1: str, addr2: str, use_llm: bool = False) -> Dict[str, Any]:
         """对两个地址文本执行评分 + 裁决，返回判断结果。"""
+        rec1, rec2 = self._compare_records(addr1, addr2)
+        parsed1 = self.parser.parse(rec1.raw_address)
+        parsed2 = self.parser.parse(rec2.raw_address)
+        return self._compare_parsed(rec1, parsed1, rec2, parsed2, use_llm)
+
+    async def acompare_addresses(self, addr1: str, addr2: str, use_llm: bool = False) -> Dict[str, Any]:
+        """compare_addresses 的异步版本：两个地址的 LLM 解析并发发出，共用解析器的异步连接池。"""
+        rec1, rec2 = self._compare_records(addr1, addr2)
+        parsed1, parsed2 = await asyncio.gather(
+            self.parser.aparse(rec1.raw_address),
+            self.parser.aparse(rec2.raw_address),
+        )
+        # 裁决可能走同步的 LLM 请求，放到线程里执行，不阻塞事件循环
+        return await asyncio.to_thread(self._compare_parsed, rec1, parsed1, rec2, parsed2, use_llm)
+
+    @staticmethod
+    def _compare_records(addr1: str, addr2: str) -> Tuple[AddressRecord, AddressRecord]:
         rec1 = AddressRecord(rid="addr_1", source="api", raw_address=addr1.strip())
         rec2 = AddressRecord(rid="addr_2", source="api", raw_address=addr2.strip())
-
-        parsed1 = self._normalize_parsed_fields(self.parser.parse(rec1.raw_address))
-        parsed2 = self._normalize_parsed_fields(self.parser.parse(rec2.raw_address))
+        return rec1, rec2
+
+    def _compare_parsed(
+        self,
+        rec1: AddressRecord,
+        parsed1: ParsedAddress,
+        rec2: AddressRecord,
+        parsed2: ParsedAddress,
+        use_llm: bool,
+    ) -> Dict[str, Any]:
+        parsed1 = self._normalize_parsed_fields(parsed1)
+        parsed2 = self._normalize_parsed_fields(parsed2)
 
         score = self.scorer.score_pair(rec1, parsed1, rec2, parsed2, relative_anchor_bonus=0.0)
         final = self.judge.judge((rec1, parsed1), [(rec2, parsed2)], [score], use_llm=use_llm)
@@ -181,8 +246,8 @@ class AddressGovernancePipeline:
             "score": final.score,
             "feature_scores": final.feature_scores,
             "evidence": final.evidence,
-            "addr1_parsed": asdict(parsed1),
-            "addr2_parsed": asdict(parsed2),
+            "addr1_parsed": parsed1.to_dict(),
+            "addr2_parsed": parsed2.to_dict(),
         }
 
     def _normalize_parsed_fields(self, parsed: ParsedAddress) -> ParsedAddress:
@@ -238,7 +303,7 @@ def _row_to_parsed(row: Dict[str, Any]) -> ParsedAddress:
         setattr(parsed, field, row.get(field))
     if row.get("intersection_json"):
         try:
-            inter = json.loads(row["intersection_json"])
+            inter = json_loads(row["intersection_json"])
             if isinstance(inter, list) and len(inter) == 2:
                 parsed.intersection = (inter[0], inter[1])
         except Exception:
@@ -251,7 +316,7 @@ def _row_to_record(row: Dict[str, Any]) -> AddressRecord:
     extra = {}
     try:
         if row.get("extra_json"):
-            extra = json.loads(row["extra_json"])
+            extra = json_loads(row["extra_json"])
     except Exception:
         extra = {}
     return AddressRecord(
@@ -1,33 +1,86 @@
 from __future__ import annotations
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from .models import AddressRecord, ParsedAddress, MatchResult
-from .utils import jaccard_sim, haversine_m, geo_score
+from .utils import jaccard_sets, haversine_m, haversine_m_np, geo_score, geo_score_np
+
+def weighted_scores(features: Dict[str, np.ndarray], n: int, weights: Dict[str, float]) -> np.ndarray:
+    """按列计算加权得分：按权重顺序逐列累加，与 Scorer.score_pair 逐项求和的顺序一致，得分逐位相同"""
+    denom = sum(max(0.0, float(v)) for v in weights.values()) or 1.0
+    num = np.zeros(n)
+    for k, w in weights.items():
+        if k in features:
+            num += float(w) * features[k]
+    return num / denom
 
 class Scorer:
     def __init__(self, weights: Dict[str, float], thresholds: Dict[str, float]):
         self.w = weights
         self.th = thresholds
+        # 每对都要用的量在构造时算好：分母、非零权重项（零权重项对加权和没有贡献）、阈值
+        self._denom = sum(max(0.0, float(v)) for v in weights.values()) or 1.0
+        self._active = [(k, float(w)) for k, w in weights.items() if float(w) != 0.0]
+        self._same_th = float(thresholds.get("same", 0.78))
+        self._unsure_th = float(thresholds.get("unsure", 0.55))
 
     def score_pair(self,
                    r1: AddressRecord, p1: ParsedAddress,
                    r2: AddressRecord, p2: ParsedAddress,
                    relative_anchor_bonus: float = 0.0) -> MatchResult:
-        fs: Dict[str, float] = {}
-        fs["district"] = 1.0 if (p1.district and p2.district and p1.district == p2.district) else 0.0
-        fs["aoi"] = max(jaccard_sim(p1.aoi, p2.aoi, 2), jaccard_sim(p1.aoi, p2.aoi, 3)) if (p1.aoi and p2.aoi) else 0.0
-        fs["building"] = 1.0 if (p1.building and p2.building and p1.building.upper() == p2.building.upper()) else 0.0
-        fs["floor"] = 1.0 if (p1.floor and p2.floor and p1.floor == p2.floor) else 0.0
-        fs["room"] = 1.0 if (p1.room and p2.room and p1.room == p2.room) else 0.0
+        fs = self.score_pair_features(r1, p1, r2, p2, relative_anchor_bonus=relative_anchor_bonus)
 
-        road_sim = 0.0
-        if p1.road and p2.road:
-            road_sim = max(road_sim, jaccard_sim(p1.road, p2.road, 2))
-        if p1.road_no and p2.road_no and p1.road_no == p2.road_no:
-            road_sim = max(road_sim, 1.0)
-        fs["road"] = road_sim
+        num = 0.0
+        for k, w in self._active:
+            num += w * float(fs.get(k, 0.0))
+        score = num / self._denom
+
+        return MatchResult(decision=self._decide(score), score=score, feature_scores=fs, evidence={})
+
+    def score_candidates(self,
+                         r1: AddressRecord, p1: ParsedAddress,
+                         cands: List[Tuple[AddressRecord, ParsedAddress]],
+                         relative_anchor_bonuses: Sequence[float]) -> List[MatchResult]:
+        """一条查询与多个候选一次性打分：距离与加权求和按列向量化计算，结果与逐对 score_pair 一致"""
+        n = len(cands)
+        if n == 0:
+            return []
+        rows = [self._parsed_features(p1, p2) for _, p2 in cands]
+
+        geo = np.zeros(n)
+        if r1.lat is not None and r1.lon is not None:
+            has_geo = np.array([r2.lat is not None and r2.lon is not None for r2, _ in cands])
+            if has_geo.any():
+                lats = np.array([r2.lat for r2, _ in cands], dtype=float)
+                lons = np.array([r2.lon for r2, _ in cands], dtype=float)
+                geo[has_geo] = geo_score_np(haversine_m_np(r1.lat, r1.lon, lats[has_geo], lons[has_geo]))
+        for fs, g, bonus in zip(rows, geo, relative_anchor_bonuses):
+            fs["geo"] = float(g)
+            fs["relative_anchor"] = float(bonus)
+
+        features = {k: np.array([fs[k] for fs in rows]) for k in rows[0]}
+        scores = weighted_scores(features, n, self.w)
+        return [
+            MatchResult(decision=self._decide(score), score=score, feature_scores=fs, evidence={})
+            for fs, score in zip(rows, scores.tolist())
+        ]
 
-        fs["shop"] = max(jaccard_sim(p1.shop_name, p2.shop_name, 2), jaccard_sim(p1.shop_name, p2.shop_name, 3)) if (p1.shop_name and p2.shop_name) else 0.0
+    def _decide(self, score: float) -> str:
+        # 阈值决策：根据预设的阈值把连续的相似度分数映射为离散的决策类别（SAME / UNSURE / DIFFERENT）
+        # 可根据需要调整
+        if score >= self._same_th:
+            return "SAME"
+        if score >= self._unsure_th:
+            return "UNSURE"
+        return "DIFFERENT"
+
+    def score_pair_features(self,
+                            r1: AddressRecord, p1: ParsedAddress,
+                            r2: AddressRecord, p2: ParsedAddress,
+                            relative_anchor_bonus: float = 0.0) -> Dict[str, float]:
+        """各特征的原始相似度（0~1），与权重、阈值无关，可在调参时复用"""
+        fs = self._parsed_features(p1, p2)
 
         dist = None
         if r1.lat is not None and r1.lon is not None and r2.lat is not None and r2.lon is not None:
@@ -35,22 +88,24 @@ class Scorer:
         fs["geo"] = geo_score(dist)
 
         fs["relative_anchor"] = float(relative_anchor_bonus)
+        return fs
 
-        denom = sum(max(0.0, float(v)) for v in self.w.values()) or 1.0
-        num = 0.0
-        for k, w in self.w.items():
-            num += float(w) * float(fs.get(k, 0.0))
-        score = num / denom
+    def _parsed_features(self, p1: ParsedAddress, p2: ParsedAddress) -> Dict[str, float]:
+        # 只依赖解析字段的特征；geo / relative_anchor 由调用方补上（单对或按列批量）
+        fs: Dict[str, float] = {}
+        fs["district"] = 1.0 if (p1.district and p2.district and p1.district == p2.district) else 0.0
+        # n-gram 集合与大写楼栋号取自 ParsedAddress 上的缓存，每条记录只算一次
+        fs["aoi"] = max(jaccard_sets(p1.aoi_ngrams[0], p2.aoi_ngrams[0]), jaccard_sets(p1.aoi_ngrams[1], p2.aoi_ngrams[1])) if (p1.aoi and p2.aoi) else 0.0
+        fs["building"] = 1.0 if (p1.building and p2.building and p1.building_upper == p2.building_upper) else 0.0
+        fs["floor"] = 1.0 if (p1.floor and p2.floor and p1.floor == p2.floor) else 0.0
+        fs["room"] = 1.0 if (p1.room and p2.room and p1.room == p2.room) else 0.0
 
-        # 阈值决策：根据预设的阈值把连续的相似度分数映射为离散的决策类别（SAME / UNSURE / DIFFERENT）
-        # 可根据需要调整
-        same_th = float(self.th.get("same", 0.78))
-        unsure_th = float(self.th.get("unsure", 0.55))
-        if score >= same_th:
-            decision = "SAME"
-        elif score >= unsure_th:
-            decision = "UNSURE"
-        else:
-            decision = "DIFFERENT"
-
-        return MatchResult(decision=decision, score=score, feature_scores=fs, evidence={})
+        road_sim = 0.0
+        if p1.road and p2.road:
+            road_sim = max(road_sim, jaccard_sets(p1.road_ngrams, p2.road_ngrams))
+        if p1.road_no and p2.road_no and p1.road_no == p2.road_no:
+            road_sim = max(road_sim, 1.0)
+        fs["road"] = road_sim
+
+        fs["shop"] = max(jaccard_sets(p1.shop_ngrams[0], p2.shop_ngrams[0]), jaccard_sets(p1.shop_ngrams[1], p2.shop_ngrams[1])) if (p1.shop_name and p2.shop_name) else 0.0
+        return fs
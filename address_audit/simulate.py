@@ -1,7 +1,8 @@
 from __future__ import annotations
-import random
 import uuid
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
 
 from .models import AddressRecord
 
@@ -68,64 +69,103 @@ def seed_base_entities() -> Dict[str, List[Dict]]:
     ]
     return {"roads": roads, "pois": pois, "anchors": anchors}
 
-def generate_address_records(n_entities: int = 30, variants_per_entity: int = 5, seed: int = 7) -> Tuple[List[AddressRecord], List[Tuple[str,str,int]]]:
-    random.seed(seed)
-    base_lat, base_lon = 31.8200, 117.1299
-
-    entities = []
-    for _ in range(n_entities):
-        aoi = random.choice(["高新创新园","蜀峰广场","百盛山甄选自助餐厅-城南店","创新园"])
-        building = random.choice(["F9A","F9B","A12","B7","5#","3#"])
-        floor = random.choice(["1","2","3","4","5"])
-        room = random.choice(["101","203","305","508","1203"])
-        road = random.choice(["创新大道","科学大道","文昌路"])
-        road_no = str(random.choice([66, 88, 110, 120, 188]))
-        shop = random.choice(["惠康大药房","益康大药房","便利店","咖啡馆","自助餐厅"])
-        lat = base_lat + random.uniform(-0.01, 0.01)
-        lon = base_lon + random.uniform(-0.01, 0.01)
-        entities.append({"aoi": aoi, "building": building, "floor": floor, "room": room,
-                         "road": road, "road_no": road_no, "shop": shop,
-                         "lat": lat, "lon": lon, "district": "蜀山区"})
+_AOIS = ["高新创新园","蜀峰广场","百盛山甄选自助餐厅-城南店","创新园"]
+_BUILDINGS = ["F9A","F9B","A12","B7","5#","3#"]
+_FLOORS = ["1","2","3","4","5"]
+_FLOORS_CN = {"1":"一","2":"二","3":"三","4":"四","5":"五"}
+_ROOMS = ["101","203","305","508","1203"]
+_ROADS = ["创新大道","科学大道","文昌路"]
+_ROAD_NOS = ["66", "88", "110", "120", "188"]
+_SHOPS = ["惠康大药房","益康大药房","便利店","咖啡馆","自助餐厅"]
+_INTERSECTIONS = [
+    "（科学大道与天波路交口西北40米）",
+    "（文昌路与永乐北路交叉口东南60米）",
+    "（名儒学校中学部东侧110米）",
+    ""
+]
+_SOURCES = ["gaode","manual","crm","delivery","network_grid","poi"]
 
+def generate_address_records(n_entities: int = 30, variants_per_entity: int = 5, seed: int = 7) -> Tuple[List[AddressRecord], List[Tuple[str,str,int]]]:
     records: List[AddressRecord] = []
-    entity_to_rids: List[List[str]] = []
+    labels: List[Tuple[str,str,int]] = []
+    for rec, label in iter_address_records(n_entities, variants_per_entity, seed):
+        if rec is not None:
+            records.append(rec)
+        else:
+            labels.append(label)
+    return records, labels
+
+def iter_address_records(n_entities: int = 30, variants_per_entity: int = 5, seed: int = 7
+                         ) -> Iterator[Tuple[Optional[AddressRecord], Optional[Tuple[str,str,int]]]]:
+    """逐条产出 (记录, None)，记录全部产出后再逐条产出 (None, 标注对)；与 generate_address_records 的数据一致。
+    生成过程只保留 rid，不保留记录对象；标注对需整体打乱，仍在内存中一次生成。"""
+    # 所有随机量按字段整列一次抽取（实体 n 维、变体 n×v 维），循环里只做取值与字符串拼接
+    rng = np.random.default_rng(seed)
+    base_lat, base_lon = 31.8200, 117.1299
+    n, v = n_entities, variants_per_entity
+
+    ent = {
+        "aoi": rng.integers(len(_AOIS), size=n).tolist(),
+        "building": rng.integers(len(_BUILDINGS), size=n).tolist(),
+        "floor": rng.integers(len(_FLOORS), size=n).tolist(),
+        "room": rng.integers(len(_ROOMS), size=n).tolist(),
+        "road": rng.integers(len(_ROADS), size=n).tolist(),
+        "road_no": rng.integers(len(_ROAD_NOS), size=n).tolist(),
+        "shop": rng.integers(len(_SHOPS), size=n).tolist(),
+        "lat": (base_lat + rng.uniform(-0.01, 0.01, n)).tolist(),
+        "lon": (base_lon + rng.uniform(-0.01, 0.01, n)).tolist(),
+    }
+    entities = [
+        {"aoi": _AOIS[ent["aoi"][i]], "building": _BUILDINGS[ent["building"][i]], "floor": _FLOORS[ent["floor"][i]],
+         "room": _ROOMS[ent["room"][i]], "road": _ROADS[ent["road"][i]], "road_no": _ROAD_NOS[ent["road_no"][i]],
+         "shop": _SHOPS[ent["shop"][i]], "lat": ent["lat"][i], "lon": ent["lon"][i], "district": "蜀山区"}
+        for i in range(n)
+    ]
 
-    def variant_text(e: Dict) -> str:
-        floor_cn = {"1":"一","2":"二","3":"三","4":"四","5":"五"}[e["floor"]]
-        floor_style = random.choice([f"{e['floor']}楼", f"{e['floor']}层", f"{floor_cn}楼", f"{floor_cn}层"])
-        room_style = random.choice([f"{e['room']}室", f"房{e['room']}", f"{e['room']}"])
-        building_style = random.choice([e["building"], f"{e['building']}栋", f"{e['building']}号楼"])
-        aoi_style = random.choice([e["aoi"], e["aoi"]+"一期" if e["aoi"]=="蜀峰广场" else e["aoi"]])
-        inter = random.choice([
-            "（科学大道与天波路交口西北40米）",
-            "（文昌路与永乐北路交叉口东南60米）",
-            "（名儒学校中学部东侧110米）",
-            ""
-        ])
+    # 变体层面的随机量：文本风格选择、坐标抖动、行政区噪声、来源
+    var = {
+        "floor_style": rng.integers(4, size=(n, v)).tolist(),
+        "room_style": rng.integers(3, size=(n, v)).tolist(),
+        "building_style": rng.integers(3, size=(n, v)).tolist(),
+        "aoi_style": rng.integers(2, size=(n, v)).tolist(),
+        "inter": rng.integers(len(_INTERSECTIONS), size=(n, v)).tolist(),
+        "template": rng.integers(3, size=(n, v)).tolist(),
+        "pharmacy_swap": (rng.random((n, v)) < 0.3).tolist(),
+        "pharmacy_pick": rng.integers(2, size=(n, v)).tolist(),
+        "baishan_swap": (rng.random((n, v)) < 0.5).tolist(),
+        "baishan_pick": rng.integers(2, size=(n, v)).tolist(),
+        "dlat": rng.uniform(-0.0002, 0.0002, (n, v)).tolist(),
+        "dlon": rng.uniform(-0.0002, 0.0002, (n, v)).tolist(),
+        "grid_noise": (rng.random((n, v)) < 0.08).tolist(),
+        "source": rng.integers(len(_SOURCES), size=(n, v)).tolist(),
+    }
+
+    def variant_text(e: Dict, i: int, k: int) -> str:
+        floor_cn = _FLOORS_CN[e["floor"]]
+        floor_style = [f"{e['floor']}楼", f"{e['floor']}层", f"{floor_cn}楼", f"{floor_cn}层"][var["floor_style"][i][k]]
+        room_style = [f"{e['room']}室", f"房{e['room']}", f"{e['room']}"][var["room_style"][i][k]]
+        building_style = [e["building"], f"{e['building']}栋", f"{e['building']}号楼"][var["building_style"][i][k]]
+        aoi_style = [e["aoi"], e["aoi"]+"一期" if e["aoi"]=="蜀峰广场" else e["aoi"]][var["aoi_style"][i][k]]
+        inter = _INTERSECTIONS[var["inter"][i][k]]
         shop_style = e["shop"]
-        if e["shop"] in ["惠康大药房","益康大药房"] and random.random() < 0.3:
-            shop_style = random.choice(["惠康大药房","益康大药房"])
-        if e["aoi"].startswith("百盛山") and random.random() < 0.5:
-            shop_style = random.choice(["百盛山海鲜","百盛山甄选自助餐厅-城南店"])
-        return random.choice([
+        if e["shop"] in ["惠康大药房","益康大药房"] and var["pharmacy_swap"][i][k]:
+            shop_style = ["惠康大药房","益康大药房"][var["pharmacy_pick"][i][k]]
+        if e["aoi"].startswith("百盛山") and var["baishan_swap"][i][k]:
+            shop_style = ["百盛山海鲜","百盛山甄选自助餐厅-城南店"][var["baishan_pick"][i][k]]
+        return [
             f"合肥市蜀山区{e['road']}{e['road_no']}号 {aoi_style} {building_style} {floor_style} {room_style} {shop_style}{inter}",
             f"安徽省合肥市蜀山区{aoi_style}{building_style}{floor_style}{room_style}（{e['road']}{e['road_no']}号附近）{shop_style}{inter}",
             f"合肥蜀山区 {e['road']} {building_style} {floor_style} {room_style} {shop_style}{inter}",
-        ])
+        ][var["template"][i][k]]
 
-    sources = ["gaode","manual","crm","delivery","network_grid","poi"]
-
-    for e in entities:
+    entity_to_rids: List[List[str]] = []
+    for i, e in enumerate(entities):
         rids = []
-        for _ in range(variants_per_entity):
+        for k in range(v):
             rid = _rid()
-            raw = variant_text(e)
-            lat = e["lat"] + random.uniform(-0.0002, 0.0002)
-            lon = e["lon"] + random.uniform(-0.0002, 0.0002)
-            grid = "瑶海区" if random.random() < 0.08 else "蜀山区"
-            rec = AddressRecord(rid=rid, source=random.choice(sources), raw_address=raw,
-                                district_claim="蜀山区", grid_district=grid, lat=lat, lon=lon)
-            records.append(rec)
+            yield AddressRecord(rid=rid, source=_SOURCES[var["source"][i][k]], raw_address=variant_text(e, i, k),
+                                district_claim="蜀山区", grid_district="瑶海区" if var["grid_noise"][i][k] else "蜀山区",
+                                lat=e["lat"] + var["dlat"][i][k], lon=e["lon"] + var["dlon"][i][k]), None
             rids.append(rid)
         entity_to_rids.append(rids)
 
@@ -135,14 +175,15 @@ def generate_address_records(n_entities: int = 30, variants_per_entity: int = 5,
             for j in range(i+1, len(rids)):
                 labels.append((rids[i], rids[j], 1))
 
+    # 负样本：一次抽取与正样本等量的随机记录对，丢弃自身配对与同实体配对
     all_rids = [rid for group in entity_to_rids for rid in group]
-    for _ in range(len(labels)):
-        a = random.choice(all_rids); b = random.choice(all_rids)
-        if a == b:
-            continue
-        same_cluster = any(a in g and b in g for g in entity_to_rids)
-        if not same_cluster:
-            labels.append((a, b, 0))
-
-    random.shuffle(labels)
-    return records, labels
+    if all_rids:
+        n_pos = len(labels)
+        a_idx = rng.integers(len(all_rids), size=n_pos)
+        b_idx = rng.integers(len(all_rids), size=n_pos)
+        # all_rids 按实体顺序展开，下标整除 v 即实体编号
+        keep = (a_idx // v) != (b_idx // v)
+        labels.extend((all_rids[a], all_rids[b], 0) for a, b in zip(a_idx[keep].tolist(), b_idx[keep].tolist()))
+
+    for i in rng.permutation(len(labels)).tolist():
+        yield None, labels[i]
@@ -1,10 +1,24 @@
 from __future__ import annotations
 import math
 import re
-from typing import Optional, Set, Tuple, Any
+from typing import Any, FrozenSet, List, Optional, Set, Tuple
 from dataclasses import asdict, is_dataclass
+from functools import lru_cache
 import json
 
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖（pip install address_audit[fast]），缺失时回退到标准库 json
+    orjson = None
+
+try:
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except ImportError:  # numba 为可选依赖（pip install address_audit[jit]），缺失时使用纯 Python 实现
+    _NUMBA_AVAILABLE = False
+
 
 _CN_NUM = {
     "零": 0, "〇": 0,
@@ -33,43 +47,58 @@ def cn_to_int(s: str) -> Optional[int]:
         return tens * 10 + ones
     return None
 
+# normalize_text / char_ngram_set 用到的正则与字符映射，导入时编译一次
+# 全角括号/方括号、全角数字一次 translate 转半角
+_FULLWIDTH_TRANS = str.maketrans("（）【】０１２３４５６７８９", "()[]0123456789")
+_PAREN_RE = re.compile(r"\([^)]*\)")
+_BRACKET_RE = re.compile(r"\[[^\]]*\]")
+_WS_RE = re.compile(r"\s+")
+
 def normalize_text(text: str) -> str:
     """清洗和标准化文本"""
     if text is None:
         return ""
-    t = text.strip()  
-
-    # 全角括号/方括号转半角
-    t = t.replace("（", "(").replace("）", ")").replace("【", "[").replace("】", "]")
+    t = text.strip().translate(_FULLWIDTH_TRANS)
 
     # 移除括号及其内容
-    t2 = re.sub(r"\([^)]*\)", " ", t)    
-    t2 = re.sub(r"\[[^\]]*\]", " ", t2)
+    t2 = _PAREN_RE.sub(" ", t)
+    t2 = _BRACKET_RE.sub(" ", t2)
 
     # 压缩空白字符
-    t2 = re.sub(r"\s+", " ", t2)  
-
-    # 全角数字转半角数字
-    t2 = t2.translate(str.maketrans("０１２３４５６７８９", "0123456789"))
+    t2 = _WS_RE.sub(" ", t2)
 
     return t2.lower().strip()
 
 def char_ngram_set(s: str, n: int = 2) -> Set[str]:
-    s = re.sub(r"\s+", "", s)
+    s = _WS_RE.sub("", s)
     if len(s) < n:
         return {s} if s else set()
     return {s[i:i+n] for i in range(len(s) - n + 1)}
 
+# (字符串, n) -> n-gram 集合缓存：AOI/道路/店名在候选对之间大量重复，每个取值只切分一次；
+# 限制容量，长期运行的服务不会随输入无限增长
+@lru_cache(maxsize=65536)
+def _ngrams(s: str, n: int) -> FrozenSet[str]:
+    return frozenset(char_ngram_set(s, n))
+
 def jaccard_sim(a: str, b: str, n: int = 2) -> float:
     if not a or not b:
         return 0.0
-    A, B = char_ngram_set(a, n), char_ngram_set(b, n)
+    A, B = _ngrams(a, n), _ngrams(b, n)
     if not A or not B:
         return 0.0
     return len(A & B) / max(1, len(A | B))
 
-def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371000.0
+def jaccard_sets(A: FrozenSet[str], B: FrozenSet[str]) -> float:
+    """两侧 n-gram 集合都已算好的 jaccard_sim"""
+    if not A or not B:
+        return 0.0
+    return len(A & B) / max(1, len(A | B))
+
+_EARTH_R_M = 6371000.0
+
+def _haversine_py(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    R = _EARTH_R_M
     phi1, phi2 = math.radians(lat1), math.radians(lat2)
     dphi = math.radians(lat2 - lat1)
     dl = math.radians(lon2 - lon1)
@@ -77,6 +106,23 @@ def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R * c
 
+# 装了 numba 时编译为机器码；不开 fastmath，避免重排浮点运算让 geo_score 分档边界附近的结果漂移
+_haversine = njit(cache=True)(_haversine_py) if _NUMBA_AVAILABLE else _haversine_py
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    return _haversine(lat1, lon1, lat2, lon2)
+
+def haversine_m_np(lat1: float, lon1: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """一个点到一组点的球面距离（米），用于一次性给同一查询的全部候选算距离"""
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    phi1, phi2 = math.radians(lat1), np.radians(lats)
+    dphi = np.radians(lats - lat1)
+    dl = np.radians(lons - lon1)
+    a = np.sin(dphi/2)**2 + math.cos(phi1)*np.cos(phi2)*np.sin(dl/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+    return _EARTH_R_M * c
+
 def geo_score(dist_m: Optional[float]) -> float:
     if dist_m is None:
         return 0.0
@@ -88,43 +134,182 @@ def geo_score(dist_m: Optional[float]) -> float:
         return 0.4
     return 0.0
 
+def geo_score_np(dist_m: np.ndarray) -> np.ndarray:
+    """geo_score 的数组版本，分档与标量版一致"""
+    d = np.asarray(dist_m, dtype=float)
+    return np.select([d <= 30, d <= 80, d <= 200], [1.0, 0.7, 0.4], 0.0)
+
+# 中文方位 -> (纬度分量, 经度分量)；纬度：北正南负， 经度：东正西负
+_DIRECTIONS = {
+    "东": (0.0, 1.0), "西": (0.0, -1.0), "南": (-1.0, 0.0), "北": (1.0, 0.0),
+    "东北": (1.0, 1.0), "西北": (1.0, -1.0), "东南": (-1.0, 1.0), "西南": (-1.0, -1.0),
+}
+# 同一方位的单位向量（对角线方向已归一化，避免距离膨胀），供 offset_latlon 直接查表
+_UNIT_DIRECTIONS = {
+    d: (dlat / math.sqrt(dlat*dlat + dlon*dlon), dlon / math.sqrt(dlat*dlat + dlon*dlon))
+    for d, (dlat, dlon) in _DIRECTIONS.items()
+}
+
 def direction_to_vector(direction: str) -> Tuple[float, float]:
     # 方向向量转换（direction_to_vector），将中文方位映射为笛卡尔坐标系单位向量。
     # 纬度：北正南负， 经度：东正西负
-    d = (direction or "").strip()
-    if d == "东": return (0.0, 1.0)
-    if d == "西": return (0.0, -1.0)
-    if d == "南": return (-1.0, 0.0)
-    if d == "北": return (1.0, 0.0)
-    if d == "东北": return (1.0, 1.0)
-    if d == "西北": return (1.0, -1.0)
-    if d == "东南": return (-1.0, 1.0)
-    if d == "西南": return (-1.0, -1.0)
-    return (0.0, 0.0)
+    return _DIRECTIONS.get((direction or "").strip(), (0.0, 0.0))
 
 def offset_latlon(lat: float, lon: float, direction: str, dist_m: float) -> Tuple[float, float]:
     # 经纬度偏移量计算（offset_latlon）， 采用球面近似模型（适用于<1km短距离）
     # 极简近似：1 deg lat ~ 111km, 1 deg lon ~ 111km*cos(lat)
-    from math import cos, radians, sqrt
-    dlat_u, dlon_u = direction_to_vector(direction)
-
-    # 向量归一化（避免对角线距离膨胀）
-    norm = sqrt(dlat_u*dlat_u + dlon_u*dlon_u) or 1.0
-    dlat_u /= norm
-    dlon_u /= norm
+    dlat_u, dlon_u = _UNIT_DIRECTIONS.get((direction or "").strip(), (0.0, 0.0))
 
     # 1度纬度 ≈ 111 km（全球恒定）
     dlat = (dist_m * dlat_u) / 111000.0
 
     # 1度经度 ≈ 111 km × cos(纬度)（随纬度变化）
-    dlon = (dist_m * dlon_u) / (111000.0 * max(0.2, cos(radians(lat))))
+    dlon = (dist_m * dlon_u) / (111000.0 * max(0.2, math.cos(math.radians(lat))))
 
     return (lat + dlat, lon + dlon)
 
+# ---- geohash：经纬度 -> base32 字符串（经度/纬度比特交织，z-order） ----
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_GEOHASH_DECODE = {c: i for i, c in enumerate(_GEOHASH_BASE32)}
+_GEOHASH_CHARS = np.array(list(_GEOHASH_BASE32))
+
+def _geohash_bits(length: int) -> Tuple[int, int]:
+    """返回 (纬度比特数, 经度比特数)；交织从经度开始，奇数总比特时经度多 1 位"""
+    total = 5 * length
+    return total // 2, total - total // 2
+
+def geohash_length_for(grid_precision: int) -> int:
+    """选取格子高度最接近 10^-grid_precision 度的 geohash 长度，使网格尺度与按小数位取整时相当"""
+    target = -grid_precision * math.log(10)
+    return min(range(1, 13), key=lambda n: abs(math.log(180.0 / 2 ** _geohash_bits(n)[0]) - target))
+
+def _spread(x: int) -> int:
+    # 把 32 位整数的各比特分散到偶数位（位间插 0），用于比特交织
+    x &= 0xFFFFFFFF
+    x = (x | (x << 16)) & 0x0000FFFF0000FFFF
+    x = (x | (x << 8)) & 0x00FF00FF00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F0F0F0F0F
+    x = (x | (x << 2)) & 0x3333333333333333
+    x = (x | (x << 1)) & 0x5555555555555555
+    return x
+
+def _compact(x: int) -> int:
+    # _spread 的逆运算：取出偶数位上的比特
+    x &= 0x5555555555555555
+    x = (x | (x >> 1)) & 0x3333333333333333
+    x = (x | (x >> 2)) & 0x0F0F0F0F0F0F0F0F
+    x = (x | (x >> 4)) & 0x00FF00FF00FF00FF
+    x = (x | (x >> 8)) & 0x0000FFFF0000FFFF
+    x = (x | (x >> 16)) & 0x00000000FFFFFFFF
+    return x
+
+def _interleave(lat_i: int, lon_i: int, length: int) -> int:
+    if (5 * length) % 2:
+        return _spread(lon_i) | (_spread(lat_i) << 1)
+    return (_spread(lon_i) << 1) | _spread(lat_i)
+
+def _geohash_from_int(h: int, length: int) -> str:
+    return "".join(_GEOHASH_BASE32[(h >> (5 * (length - 1 - i))) & 31] for i in range(length))
+
+def _geohash_cell(lat: float, lon: float, length: int) -> Tuple[int, int]:
+    lat_bits, lon_bits = _geohash_bits(length)
+    lat_i = min(max(int(math.floor((lat + 90.0) / 180.0 * (1 << lat_bits))), 0), (1 << lat_bits) - 1)
+    lon_i = min(max(int(math.floor((lon + 180.0) / 360.0 * (1 << lon_bits))), 0), (1 << lon_bits) - 1)
+    return lat_i, lon_i
+
+def geohash_encode(lat: float, lon: float, length: int) -> str:
+    lat_i, lon_i = _geohash_cell(lat, lon, length)
+    return _geohash_from_int(_interleave(lat_i, lon_i, length), length)
+
+def geohash_encode_array(lats: np.ndarray, lons: np.ndarray, length: int) -> np.ndarray:
+    """geohash_encode 的向量化版本，逐元素结果与标量版一致"""
+    lat_bits, lon_bits = _geohash_bits(length)
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    lat_i = np.clip(np.floor((lats + 90.0) / 180.0 * (1 << lat_bits)), 0, (1 << lat_bits) - 1).astype(np.uint64)
+    lon_i = np.clip(np.floor((lons + 180.0) / 360.0 * (1 << lon_bits)), 0, (1 << lon_bits) - 1).astype(np.uint64)
+
+    def spread(x: np.ndarray) -> np.ndarray:
+        for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                            (2, 0x3333333333333333), (1, 0x5555555555555555)):
+            x = (x | (x << np.uint64(shift))) & np.uint64(mask)
+        return x
+
+    one = np.uint64(1)
+    if (5 * length) % 2:
+        h = spread(lon_i) | (spread(lat_i) << one)
+    else:
+        h = (spread(lon_i) << one) | spread(lat_i)
+    out = np.full(h.shape, "", dtype=f"<U{length}")
+    for i in range(length):
+        digits = ((h >> np.uint64(5 * (length - 1 - i))) & np.uint64(31)).astype(np.intp)
+        out = np.char.add(out, _GEOHASH_CHARS[digits])
+    return out
+
+def geohash_neighbors(gh: str) -> List[str]:
+    """返回 gh 自身及其 8 个相邻格子（3×3）；经度方向环绕，纬度越过南北极的格子丢弃"""
+    length = len(gh)
+    h = 0
+    for c in gh:
+        v = _GEOHASH_DECODE.get(c)
+        if v is None:
+            return [gh]
+        h = (h << 5) | v
+    if (5 * length) % 2:
+        lon_i, lat_i = _compact(h), _compact(h >> 1)
+    else:
+        lon_i, lat_i = _compact(h >> 1), _compact(h)
+    lat_bits, lon_bits = _geohash_bits(length)
+    out = []
+    for dlat in (-1, 0, 1):
+        la = lat_i + dlat
+        if la < 0 or la >= (1 << lat_bits):
+            continue
+        for dlon in (-1, 0, 1):
+            lo = (lon_i + dlon) % (1 << lon_bits)
+            out.append(_geohash_from_int(_interleave(la, lo, length), length))
+    return out
+
+def _json_default(obj: Any) -> Any:
+    # dataclass 走 to_dict（只取字段，浅层取值）；ParsedAddress 实例上缓存的派生特征不会被序列化
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return obj.to_dict() if hasattr(obj, "to_dict") else asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+# orjson 默认按 __dict__ 直接序列化 dataclass，这里交给 _json_default 处理
+_ORJSON_OPTS = orjson.OPT_PASSTHROUGH_DATACLASS if orjson is not None else 0
+
+def json_dumps(obj: Any, indent: bool = False) -> str:
+    """序列化为紧凑的 JSON 字符串，非 ASCII 字符原样保留；indent=True 时按 2 空格缩进；安装了 orjson 时由 orjson 编码"""
+    if orjson is not None:
+        return _orjson_dumps(obj, indent).decode("utf-8")
+    return _stdlib_dumps(obj, indent)
+
+def json_dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """同 json_dumps，直接返回 UTF-8 字节，用于 HTTP 请求体与写文件"""
+    if orjson is not None:
+        return _orjson_dumps(obj, indent)
+    return _stdlib_dumps(obj, indent).encode("utf-8")
+
+def _orjson_dumps(obj: Any, indent: bool) -> bytes:
+    option = _ORJSON_OPTS | orjson.OPT_INDENT_2 if indent else _ORJSON_OPTS
+    return orjson.dumps(obj, default=_json_default, option=option)
+
+def _stdlib_dumps(obj: Any, indent: bool) -> str:
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=_json_default)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+def json_loads(data: str | bytes) -> Any:
+    """解析 JSON（str 或 UTF-8 bytes）；安装了 orjson 时由 orjson 解码"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 class EnhancedJSONEncoder(json.JSONEncoder):
     def default(self, obj: Any) -> Any:
-        if is_dataclass(obj):
-            return asdict(obj)
+        if is_dataclass(obj) and not isinstance(obj, type):
+            return obj.to_dict() if hasattr(obj, "to_dict") else asdict(obj)
         if isinstance(obj, tuple):
             return list(obj)  # 将 tuple 转为 list
         return super().default(obj)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from __future__ import annotations
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 import dotenv
 dotenv.load_dotenv()
@@ -19,7 +20,16 @@ FRONTEND_DIR = ROOT / "frontend"
 cfg = load_config(DATA_DIR / "config.default.json")
 pipeline = AddressGovernancePipeline(cfg, str(DATA_DIR))
 
-app = FastAPI(title="Address Comparison Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时预热打分路径，退出时关闭解析器的 HTTP 客户端
+    pipeline.warmup()
+    yield
+    await pipeline.parser.aclose()
+
+
+app = FastAPI(title="Address Comparison Service", lifespan=lifespan)
 
 
 class CompareRequest(BaseModel):
@@ -29,12 +39,12 @@ class CompareRequest(BaseModel):
 
 
 @app.post("/compare")
-def compare_addresses(payload: CompareRequest):
+async def compare_addresses(payload: CompareRequest):
     addr1 = payload.addr1.strip()
     addr2 = payload.addr2.strip()
     if not addr1 or not addr2:
         raise HTTPException(status_code=400, detail="addr1 和 addr2 不能为空")
-    result = pipeline.compare_addresses(addr1, addr2, use_llm=payload.use_llm)
+    result = await pipeline.acompare_addresses(addr1, addr2, use_llm=payload.use_llm)
     result["use_llm"] = payload.use_llm
     return result
 
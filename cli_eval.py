@@ -1,24 +1,25 @@
 from __future__ import annotations
-import json
-from pathlib import Path
+import os
 
-from address_audit.config import load_config
-from address_audit.db import connect, init_db
+from address_audit.cli_common import get_data_dir, load_default_config
+from address_audit.db import get_conn, init_db
 from address_audit.evaluate import evaluate_current, grid_search
+from address_audit.utils import json_dumps, json_dumps_bytes
 
 def main():
-    root = Path(__file__).resolve().parent
-    data_dir = root / "data"
-    cfg = load_config(data_dir / "config.default.json")
+    data_dir = get_data_dir()
+    cfg = load_default_config()
 
-    conn = connect(cfg.db_path)
+    conn = get_conn(cfg.db_path)
     init_db(conn)
 
     cur = evaluate_current(conn, cfg)
-    print("Current config metrics:", json.dumps(cur, ensure_ascii=False, indent=2))
+    print("Current config metrics:", json_dumps(cur, indent=True))
 
-    best = grid_search(conn, cfg)
-    print("Best (grid search):", json.dumps(best, ensure_ascii=False, indent=2))
+    # 网格点评估的进程数；标注量大时调高（如 CPU 核数），默认单进程
+    workers = int(os.getenv("EVAL_WORKERS", "1"))
+    best = grid_search(conn, cfg, workers=workers)
+    print("Best (grid search):", json_dumps(best, indent=True))
 
     best_cfg = {
         "db_path": cfg.db_path,
@@ -30,7 +31,7 @@ def main():
         "parser": cfg.parser
     }
     out_path = data_dir / "config.best.json"
-    out_path.write_text(json.dumps(best_cfg, ensure_ascii=False, indent=2), encoding="utf-8")
+    out_path.write_bytes(json_dumps_bytes(best_cfg, indent=True))
     print("Wrote:", str(out_path))
 
 if __name__ == "__main__":
@@ -1,20 +1,19 @@
 from __future__ import annotations
-from pathlib import Path
-from address_audit.config import load_config
-from address_audit.pipeline import AddressGovernancePipeline
-
-import dotenv
-dotenv.load_dotenv()
+from address_audit.cli_common import get_data_dir, load_default_config
 
 def main():
-    root = Path(__file__).resolve().parent
-    data_dir = root / "data"
-    cfg = load_config(data_dir / "config.default.json")
+    # 流水线（pandas/httpx 等）与 .env 只在真正运行时加载，导入本模块保持轻量
+    import dotenv
+    dotenv.load_dotenv()
+    from address_audit.pipeline import AddressGovernancePipeline
+
+    data_dir = get_data_dir()
+    cfg = load_default_config()
 
     pipe = AddressGovernancePipeline(cfg, str(data_dir))
     result = pipe.run()
     print("Pipeline finished:", result)
-    print("Excel 数据位于:", cfg.db_path)
+    print("数据位于:", cfg.db_path)
 
 if __name__ == "__main__":
     main()
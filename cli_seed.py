@@ -1,18 +1,18 @@
 from __future__ import annotations
-from pathlib import Path
 
-from address_audit.config import load_config
+from address_audit.cli_common import load_default_config
 from address_audit.db import (
-    connect,
+    get_conn,
     init_db,
-    clear_table,
-    upsert_record,
-    upsert_road,
-    upsert_poi,
-    upsert_anchor,
+    clear_tables,
+    upsert_records_many,
+    upsert_roads_many,
+    upsert_pois_many,
+    upsert_anchors_many,
     insert_pair_labels,
+    _now_str,
 )
-from address_audit.simulate import seed_base_entities, generate_address_records
+from address_audit.simulate import seed_base_entities, iter_address_records
 
 """
 地址稽核系统的仿真数据初始化脚本：生成样例地址后写入 Excel 工作簿，便于快速搭建可复用的测试环境。
@@ -23,33 +23,51 @@ from address_audit.simulate import seed_base_entities, generate_address_records
 5) 输出写入统计并提示下一步运行 cli_run。
 """
 
+# 地址记录与标注对每攒满这么多条批量写入一次
+SEED_BATCH_ROWS = 1000
+
 def main():
-    root = Path(__file__).resolve().parent
-    data_dir = root / "data"
-    cfg = load_config(data_dir / "config.default.json")
+    cfg = load_default_config()
 
-    conn = connect(cfg.db_path)
+    conn = get_conn(cfg.db_path)
     init_db(conn)
 
-    for t in ["address_records","parsed_addresses","roads","pois","anchors","conflicts","match_logs","clusters","pair_labels"]:
-        clear_table(conn, t)
-
-    base = seed_base_entities()
-    for r in base["roads"]:
-        upsert_road(conn, r["road_id"], r["name"], r.get("district"), r.get("aliases", []))
-    for p in base["pois"]:
-        upsert_poi(conn, p["poi_id"], p["name"], p.get("poi_type"), p.get("district"), p["lat"], p["lon"], p.get("aliases", []))
-    for a in base["anchors"]:
-        upsert_anchor(conn, a["anchor_id"], a.get("anchor_type"), a["key_text"], a.get("district"), a["lat"], a["lon"])
-
-    records, labels = generate_address_records(n_entities=6, variants_per_entity=5, seed=7)
-    for rec in records:
-        upsert_record(conn, rec)
-    insert_pair_labels(conn, labels)
-
-    print(f"Excel 数据写入: {cfg.db_path}")
-    print(f"Inserted records: {len(records)}")
-    print(f"Inserted pair labels: {len(labels)}")
+    with conn.batch():
+        clear_tables(conn, ["address_records","parsed_addresses","roads","pois","anchors","conflicts","match_logs","clusters","pair_labels"])
+
+        # 各表一次批量写入，整个初始化在同一个事务内提交
+        base = seed_base_entities()
+        upsert_roads_many(conn, base["roads"])
+        upsert_pois_many(conn, base["pois"])
+        upsert_anchors_many(conn, base["anchors"])
+
+        # 生成器逐条产出记录与标注对，攒满 SEED_BATCH_ROWS 条写一次，内存占用与数据量无关
+        now = _now_str()
+        buf_rec, buf_lbl = [], []
+        n_records = n_labels = 0
+        for rec, label in iter_address_records(n_entities=6, variants_per_entity=5, seed=7):
+            if rec is not None:
+                buf_rec.append(rec)
+            else:
+                buf_lbl.append(label)
+            if len(buf_rec) >= SEED_BATCH_ROWS:
+                upsert_records_many(conn, buf_rec, now=now)
+                n_records += len(buf_rec)
+                buf_rec.clear()
+            if len(buf_lbl) >= SEED_BATCH_ROWS:
+                insert_pair_labels(conn, buf_lbl)
+                n_labels += len(buf_lbl)
+                buf_lbl.clear()
+        if buf_rec:
+            upsert_records_many(conn, buf_rec, now=now)
+            n_records += len(buf_rec)
+        if buf_lbl:
+            insert_pair_labels(conn, buf_lbl)
+            n_labels += len(buf_lbl)
+
+    print(f"数据写入: {cfg.db_path}")
+    print(f"Inserted records: {n_records}")
+    print(f"Inserted pair labels: {n_labels}")
     print("Next: python cli_run")
 
 if __name__ == "__main__":
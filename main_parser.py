@@ -1,17 +1,21 @@
-import dotenv
-dotenv.load_dotenv()
-
-import json
-
-from address_audit.parser_llm import OpenAILLMParser
-from address_audit.utils import EnhancedJSONEncoder
-
 """
 测试OpenAILLMParser 对一批地址的解析效果，输出原始地址和解析结果的对比，便于验证解析准确性和调试提示词。
 """
 
-if __name__ == "__main__":
-    llm_parser = OpenAILLMParser()
+def main():
+    # .env 与解析器（httpx 等）只在运行时加载
+    import dotenv
+    dotenv.load_dotenv()
+    from address_audit.parser_llm import OpenAILLMParser
+    from address_audit.cli_common import get_data_dir, load_default_config
+    from address_audit.utils import json_dumps
+
+    # 与 pipeline 共用落盘缓存，重复运行时已解析过的地址不再请求 LLM；
+    # 路径按包所在的 data 目录解析，不依赖当前工作目录
+    cfg = load_default_config()
+    llm_parser = OpenAILLMParser(
+        cache_path=cfg.parser.get("llm_cache_path", str(get_data_dir() / "llm_cache.sqlite"))
+    )
     raw_addresses = [
         "蜀山区创新大道100号高新创新园A座01室",
         "瑶海区长江东路800号名儒学校中学部",
@@ -20,8 +24,9 @@ if __name__ == "__main__":
         "广州市天河区高塘路8号中国移动南方基地",
     ]
 
+    # 每条地址单独请求、并发发出；单条失败对应位置为 None，不影响其余地址
     try:
-        llm_results = llm_parser.parse_batch(raw_addresses)
+        llm_results = llm_parser.parse_many(raw_addresses, return_exceptions=True)
     except Exception as exc:
         print(f"LLM 解析失败: {exc}")
         llm_results = [None] * len(raw_addresses)
@@ -30,7 +35,11 @@ if __name__ == "__main__":
         print(f"Raw: {raw}")
         if llm_rst is not None:
             print("llm_parsed_rst:")
-            print(json.dumps(llm_rst, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2))
+            print(json_dumps(llm_rst, indent=True))
         else:
             print("llm_parsed_rst: None")
         print("-" * 40)
+
+
+if __name__ == "__main__":
+    main()